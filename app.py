@@ -1,65 +1,402 @@
-from flask import Flask
-from flask_login import LoginManager
-from flask_wtf.csrf import CSRFProtect
-from flask_mail import Mail
+import os
+import click
+from flask import Flask, current_app, url_for
+from flask.cli import with_appcontext
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Import db from extensions to avoid circular imports
-from extensions import db
-
-# Initialize the app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'a-very-secret-key-that-should-be-changed-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///D:/Chidnand Khot/site.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['WTF_CSRF_TIME_LIMIT'] = None  # Disable CSRF time limit
-
-# Email configuration
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = 'chidanandkhot03@gmail.com'
-app.config['MAIL_PASSWORD'] = ''  # You need to set this with App Password
-app.config['MAIL_DEFAULT_SENDER'] = 'chidanandkhot03@gmail.com'
-
-# Initialize extensions
-db.init_app(app)
-csrf = CSRFProtect(app)
-mail = Mail(app)
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'  # This should work, ignoring linter error
-login_manager.login_message_category = 'info'
-
-# Import ALL models after initializing extensions to ensure all tables are created
-from models.models import User, Admin, Project, Skill, Certificate, Message, Resume, SiteImage, ContactInfo, Education, Experience
+from extensions import db, csrf, mail, login_manager
+from services.database import engine_options, configure_sqlite, sqlite_pragmas
+from services.assets import build_assets, send_static
+from services.templating import init_templates, compile_templates
+from services.compression import compress_response
+
+# Build the application. Nothing here touches the database or starts a
+# thread: schema setup (init_db), warm_up and the background services are
+# separate steps, so a pre-forking server can run each where it belongs.
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'a-very-secret-key-that-should-be-changed-in-production'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['WTF_CSRF_TIME_LIMIT'] = None  # Disable CSRF time limit
+    app.config['PAGE_CACHE_ENABLED'] = True  # Serve public pages from memory until content changes
+    app.config['FRAGMENT_CACHE_BACKEND'] = 'memory'  # Store for {% cache %} blocks: 'memory' or 'null'
+    app.config['FRAGMENT_CACHE_TIMEOUT'] = 3600  # Seconds; the cache is also emptied when content changes
+    app.config['JINJA_BYTECODE_CACHE_DIR'] = os.path.join(app.instance_path, 'jinja-bytecode')  # Shared by all workers; None disables
+    app.config['CONTENT_VERSION_POLL_INTERVAL'] = 2  # Seconds between checks for commits made by other processes
+
+    # Database configuration, driven by the environment
+    # APP_ENV=production enables WAL and the other SQLite tuning PRAGMAs
+    app.config['APP_ENV'] = os.environ.get('APP_ENV', 'development')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///D:/Chidnand Khot/site.db')
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # Seconds to wait for a free connection
+
+    # Responsive image variants generated for every uploaded image
+    app.config['IMAGE_VARIANT_WIDTHS'] = (320, 640, 960, 1280)
+    app.config['IMAGE_VARIANT_FORMATS'] = ('avif', 'webp')  # Skipped if Pillow lacks the encoder
+    app.config['IMAGE_VARIANT_QUALITY'] = 80
+
+    # Static files are linked by content hash from static/dist and cached for a year
+    app.config['ASSET_FINGERPRINTING'] = True
+    app.config['VENDOR_BUNDLE'] = True  # Use the 'flask build-vendor' bundle instead of CDNs when present
+    app.config['CRITICAL_CSS_ENABLED'] = True  # Inline above-the-fold CSS on public pages, regenerated when CSS or templates change
+    app.config['CRITICAL_CSS_FOLD_BYTES'] = 8000  # Body markup treated as above the fold
+
+    # Compression of dynamic responses, negotiated from Accept-Encoding
+    app.config['COMPRESSION_ENABLED'] = True
+    app.config['COMPRESSION_MIN_SIZE'] = 500  # Smaller bodies are sent as they are
+    app.config['COMPRESSION_MIMETYPES'] = ('text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript')
+    app.config['COMPRESSION_GZIP_LEVEL'] = 6
+    app.config['COMPRESSION_BROTLI_LEVEL'] = 5
+
+    # Let the front proxy stream file downloads: None, 'x-sendfile' or 'x-accel-redirect'
+    app.config['FILE_OFFLOAD'] = os.environ.get('FILE_OFFLOAD')
+    app.config['FILE_OFFLOAD_PREFIX'] = '/protected/'  # nginx internal location aliased to static/
+
+    # Uploads are streamed to disk while the form is parsed and refused as soon as
+    # they exceed their limit or their first bytes do not match the extension
+    app.config['MAX_CONTENT_LENGTH'] = 21 * 1024 * 1024  # Whole request, checked against Content-Length
+    app.config['UPLOAD_SIZE_LIMITS'] = {'image': 10 * 1024 * 1024, 'pdf': 20 * 1024 * 1024}
+    app.config['UPLOAD_SPOOL_SIZE'] = 1024 * 1024  # Bytes kept in memory before spilling to a temp file
+    app.config['UPLOAD_SPOOL_DIR'] = os.path.join(app.instance_path, 'upload-spool')  # Not served; best on the same filesystem as static/
+
+    # Where uploads are kept: 'local' (static/) or 's3' (any S3-compatible bucket, needs boto3)
+    app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'local')
+    app.config['STORAGE_S3_BUCKET'] = os.environ.get('STORAGE_S3_BUCKET')
+    app.config['STORAGE_S3_ENDPOINT'] = os.environ.get('STORAGE_S3_ENDPOINT')  # e.g. a MinIO stand-in; None for AWS
+    app.config['STORAGE_S3_REGION'] = os.environ.get('STORAGE_S3_REGION')
+    app.config['STORAGE_PUBLIC_URL'] = os.environ.get('STORAGE_PUBLIC_URL')  # CDN or public bucket URL; presigned URLs if None
+    app.config['STORAGE_URL_EXPIRES'] = 3600  # Seconds a presigned image URL is valid
+    app.config['STORAGE_DOWNLOAD_EXPIRES'] = 300  # Seconds a presigned resume download is valid
+    app.config['STORAGE_MULTIPART_THRESHOLD'] = 8 * 1024 * 1024  # Larger files are uploaded in parts
+    app.config['STORAGE_MULTIPART_CHUNKSIZE'] = 8 * 1024 * 1024
+
+    # Orphaned upload files: kept for a grace period, collected by a background job
+    app.config['GC_GRACE_PERIOD'] = 86400  # Seconds a file must be untouched before it can be removed
+    app.config['GC_INTERVAL'] = 86400  # Seconds between collections; None disables the background job
+
+    # Background worker pool for upload post-processing
+    app.config['JOB_WORKERS'] = 2
+    app.config['JOB_MAX_ATTEMPTS'] = 3
+    app.config['JOB_RETRY_DELAY'] = 5  # Seconds before the first retry, doubled on each failure
+
+    # Email configuration
+    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
+    app.config['MAIL_PORT'] = 587
+    app.config['MAIL_USE_TLS'] = True
+    app.config['MAIL_USERNAME'] = 'chidanandkhot03@gmail.com'
+    app.config['MAIL_PASSWORD'] = ''  # You need to set this with App Password
+    app.config['MAIL_DEFAULT_SENDER'] = 'chidanandkhot03@gmail.com'
+
+    # Contact notifications are written to the outbox and sent by a background dispatcher
+    app.config['MAIL_OUTBOX_BATCH_SIZE'] = 20  # Messages sent per batch over one SMTP connection
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 6  # Dead-lettered after this many failures
+    app.config['MAIL_OUTBOX_RETRY_DELAY'] = 30  # Seconds before the first retry, doubled on each failure
+    app.config['MAIL_OUTBOX_POLL_INTERVAL'] = 30  # Seconds between checks for retries that became due
+
+    # Contact form flood protection (token buckets per IP and per sender email)
+    app.config['CONTACT_RATE_LIMIT_ENABLED'] = True
+    app.config['TRUSTED_PROXIES'] = int(os.environ.get('TRUSTED_PROXIES', 0))  # Reverse proxies in front whose X-Forwarded-* headers are trusted
+    app.config['CONTACT_IP_BURST'] = 5
+    app.config['CONTACT_IP_PER_HOUR'] = 10
+    app.config['CONTACT_EMAIL_BURST'] = 3
+    app.config['CONTACT_EMAIL_PER_HOUR'] = 5
+    app.config['CONTACT_DUPLICATE_WINDOW'] = 600  # Seconds an identical message body is remembered for (up to twice this)
+    app.config['CONTACT_DUPLICATE_FILTER_BITS'] = 2 ** 20
+
+    # Messages shown per page in the admin inbox
+    app.config['ADMIN_MESSAGES_PER_PAGE'] = 25
+    app.config['MESSAGE_SEARCH_LIMIT'] = 50  # Ranked full-text search results shown
+
+    # Logged-in accounts cached in memory by the Flask-Login user loader
+    app.config['PRINCIPAL_CACHE_TTL'] = 60  # Seconds
+    app.config['PRINCIPAL_CACHE_SIZE'] = 256
+
+    # Password hashing runs in a small worker pool; logins beyond the queue limit are turned away
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:600000'  # Older hashes are upgraded on login
+    app.config['PASSWORD_HASH_WORKERS'] = 2
+    app.config['PASSWORD_HASH_MAX_PENDING'] = 8
+    app.config['PASSWORD_HASH_QUEUE_TIMEOUT'] = 2  # Seconds to wait for a free slot
+
+    # Static export of the public pages for nginx or a CDN; off unless a directory is set
+    app.config['STATIC_EXPORT_DIR'] = os.environ.get('STATIC_EXPORT_DIR')
+    app.config['STATIC_EXPORT_KEEP'] = 3  # Releases kept for rollback
+
+    # Overrides (e.g. from a test or the serve command) apply before derived settings
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    if 'SQLITE_PRAGMAS' not in app.config:
+        app.config['SQLITE_PRAGMAS'] = sqlite_pragmas(app.config['APP_ENV'])
+
+    # Compress dynamic text responses for clients that accept it
+    app.after_request(compress_response)
+
+    # Bytecode cache and the {% cache %} fragment tag
+    init_templates(app)
+
+    # Take the client address from X-Forwarded-For as set by our own proxies, so
+    # per-visitor limits don't see every request as coming from the proxy
+    if app.config['TRUSTED_PROXIES']:
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies)
+
+    # Serve fingerprinted static files with far-future caching
+    app.view_functions['static'] = send_static
+
+    # Initialize extensions
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, app.config['SQLITE_PRAGMAS'])
+    csrf.init_app(app)
+    mail.init_app(app)
+    login_manager.init_app(app)
+    login_manager.login_view = 'main.login'
+    login_manager.login_message_category = 'info'
+
+    # Parse multipart uploads into size-limited, sniffed spool files
+    app.request_class = UploadRequest
+
+    app.register_blueprint(main)
+    if app.config['STATIC_EXPORT_DIR']:
+        # The exported contact form posts without a CSRF token (see the contact view)
+        csrf.exempt(contact)
+
+    for command in COMMANDS:
+        app.cli.add_command(command)
+    return app
+
+# Import ALL models so db.metadata declares every table; the migrations are
+# frozen and don't read it, but tests/test_migrations.py checks them against it
+from models.models import User, Admin, Project, Skill, Certificate, Message, InboxState, OutboxMessage, Resume, SiteImage, ContactInfo, Education, Experience, ImageDerivative, Job, ContentVersion, Blob
+from services.principals import load_principal
+from services.uploads import UploadRequest
+from routes import main, contact
+from services.static_export import export_site  # also keeps the export current after commits
 
 # User loader for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    # Try to load as Admin first for admin users
-    admin = Admin.query.get(int(user_id))
-    if admin:
-        print(f"Loaded admin: {admin.email}")
-        return admin
-    # If not found, try as User
-    user = User.query.get(int(user_id))
-    if user:
-        print(f"Loaded user: {user.email}")
-        return user
-    return None
-
-# Initialize database tables
-with app.app_context():
-    db.create_all()
-    # Check if admin user exists, if not create one
-    if not Admin.query.first():
-        from werkzeug.security import generate_password_hash
-        admin = Admin()
-        admin.email = 'chidanandkhot03@gmail.com'
-        admin.password = generate_password_hash('ChidanandK@3087')
-        db.session.add(admin)
-        db.session.commit()
-        print("Admin user created successfully!")
-
-# Import routes after initializing app to avoid circular imports
-from routes import *
\ No newline at end of file
+    # Ids are namespaced ('admin:1' / 'user:7'), so this is one cached primary-key lookup
+    return load_principal(user_id)
+
+# Generate responsive variants for images uploaded before the pipeline existed
+@click.command('generate-image-variants')
+@with_appcontext
+def generate_image_variants():
+    from services.images import backfill_derivatives
+    count = backfill_derivatives()
+    print(f"Generated variants for {count} images")
+
+# Fingerprint and precompress static files, e.g. as a deploy step
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    count = build_assets()
+    print(f"Built {count} static assets")
+
+# Vendor Bootstrap, Font Awesome and animate.css locally, keeping only the rules the templates use
+@click.command('build-vendor')
+@with_appcontext
+def build_vendor():
+    from services.vendor import build_vendor_bundle
+    try:
+        sizes = build_vendor_bundle()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    for filename, (original, bundled) in sizes.items():
+        print(f"{filename}: {original // 1024} KB -> {bundled // 1024} KB")
+    build_assets()
+
+# Regenerate the inlined above-the-fold CSS of the public pages now
+@click.command('build-critical-css')
+@with_appcontext
+def build_critical_css_command():
+    from services.critical_css import build_critical_css
+    for endpoint, css in build_critical_css(current_app._get_current_object()).items():
+        print(f"{endpoint}: {'failed' if css is None else f'{len(css)} bytes'}")
+
+# Move uploads saved under random names into the content-addressed blob store
+@click.command('dedupe-uploads')
+@with_appcontext
+def dedupe_uploads():
+    from services.uploads import adopt_uploads
+    moved, reclaimed = adopt_uploads()
+    print(f"Moved {moved} uploads into the blob store, reclaimed {reclaimed / 1024:.0f} KB")
+
+# Copy existing uploads from static/ into the configured STORAGE_BACKEND
+@click.command('push-uploads')
+@with_appcontext
+def push_uploads_command():
+    from services.uploads import push_uploads
+    print(f"Copied {push_uploads()} files to {current_app.config['STORAGE_BACKEND']} storage")
+
+# Report (and with --delete remove) upload files no database row refers to
+@click.command('gc-files')
+@with_appcontext
+@click.option('--delete', is_flag=True, help='Remove the orphans instead of only listing them.')
+@click.option('--grace-hours', type=float, default=None, help='Skip files changed more recently than this.')
+def gc_files(delete, grace_hours):
+    from services.file_gc import collect_garbage
+    grace_period = grace_hours * 3600 if grace_hours is not None else None
+    report = collect_garbage(delete=delete, grace_period=grace_period)
+    for path, size in report.orphans:
+        print(f"  {path} ({size / 1024:.0f} KB)")
+    action = 'Removed' if delete else 'Found'
+    print(f"{action} {len(report.orphans)} orphaned files, {report.reclaimable / 1024:.0f} KB reclaimable; "
+          f"{report.recent} recent files skipped, {len(report.stale_sources)} stale image variant sets")
+
+# Send due outbox messages now, e.g. from cron or against a local SMTP server
+@click.command('send-outbox')
+@with_appcontext
+def send_outbox():
+    from services.mailer import drain_outbox
+    sent = drain_outbox()
+    print(f"Sent {sent} outbox messages")
+
+# Check that concurrent reads and writes against the configured database don't
+# fail (tests/test_database.py runs the same check on a scratch database)
+@click.command('db-stress')
+@with_appcontext
+@click.option('--seconds', default=10, help='How long to run for.')
+@click.option('--readers', default=8, help='Threads running public page queries.')
+@click.option('--writers', default=2, help='Threads inserting and deleting rows.')
+@click.option('--allow-production', is_flag=True, help='Run even with APP_ENV=production.')
+def db_stress(seconds, readers, writers, allow_production):
+    from services.database import stress_test
+    if current_app.config['APP_ENV'] == 'production' and not allow_production:
+        raise click.ClickException("db-stress writes to the database; pass --allow-production to run it on this one")
+    counts, errors = stress_test(current_app._get_current_object(), seconds, readers, writers)
+    print(f"{counts['reads']} reads, {counts['writes']} writes, {counts['errors']} errors")
+    for error in sorted(set(errors)):
+        print(f"  {error}")
+    if errors:
+        raise SystemExit(1)
+
+# Apply pending schema migrations and create the first admin account
+def init_db(app):
+    from services.migrations import upgrade
+    with app.app_context():
+        for migration in upgrade(db.engine):
+            print(f"Applied migration {migration.version:04d} {migration.name}")
+        # Check if admin user exists, if not create one
+        if not Admin.query.first():
+            admin = Admin()
+            admin.email = 'chidanandkhot03@gmail.com'
+            admin.set_password('ChidanandK@3087')
+            db.session.add(admin)
+            db.session.commit()
+            print("Admin user created successfully!")
+
+# Bring the database schema up to date; the only place schema changes are made
+@click.command('db-upgrade')
+@with_appcontext
+def db_upgrade():
+    init_db(current_app._get_current_object())
+    print("Database schema is up to date")
+
+# Build what the first requests would otherwise build: fingerprinted static
+# files, compiled templates, critical CSS and the rendered public pages. The
+# serve command runs this once before forking, so every worker starts with it.
+def warm_up(app):
+    from services.critical_css import CRITICAL_PAGES, build_critical_css
+
+    with app.app_context():
+        # Unchanged files are skipped
+        if app.config['ASSET_FINGERPRINTING']:
+            build_assets()
+    compile_templates(app)
+    if app.config['CRITICAL_CSS_ENABLED']:
+        build_critical_css(app)
+    client = app.test_client()
+    for endpoint in CRITICAL_PAGES:
+        with app.test_request_context():
+            client.get(url_for(endpoint))
+    # Workers open their own connections
+    with app.app_context():
+        db.engine.dispose()
+
+# Requeue outbox messages and jobs left claimed by processes that died. Runs
+# once per server start, before any worker exists; a worker starting next to
+# live siblings would otherwise take over rows they are still working on.
+def recover_interrupted_work(app):
+    from services.jobs import release_running_jobs
+    from services.mailer import release_claims
+    with app.app_context():
+        release_claims()
+        release_running_jobs()
+
+# Threads that run next to the web server in every process
+def start_background_services(app):
+    # Remove orphaned upload files periodically
+    from services.file_gc import start_garbage_collector
+    start_garbage_collector(app)
+
+    # Run the upload post-processing still queued
+    from services.jobs import resume_jobs
+    resume_jobs(app)
+
+    # Start draining the mail outbox in the background
+    from services.mailer import start_dispatcher
+    start_dispatcher(app)
+
+# Runs in each server worker right after the fork. Pooled connections
+# inherited from the parent are dropped without closing them (the parent
+# owns those sockets), and the background threads, which a fork does not
+# copy, are started.
+def init_worker(app):
+    with app.app_context():
+        db.engine.dispose(close=False)
+    start_background_services(app)
+
+# Production server: gunicorn with one process per core by default, each with
+# a pool of request threads (waitress, single process, on Windows). Put a
+# reverse proxy in front for TLS and slow clients.
+@click.command('serve')
+@click.option('--host', default='127.0.0.1', help='Interface to listen on.')
+@click.option('--port', default=8000, help='Port to listen on.')
+@click.option('--processes', default=os.cpu_count() or 1, help='Worker processes (forked; 1 on Windows).')
+@click.option('--threads', default=8, help='Request threads per worker process.')
+@click.option('--no-warm-up', is_flag=True, help='Skip building assets and caches before starting.')
+@with_appcontext
+def serve_command(host, port, processes, threads, no_warm_up):
+    from services.migrations import pending_migrations
+    from services.server import serve
+    app = current_app._get_current_object()
+    pending = pending_migrations(db.engine)
+    if pending:
+        raise click.ClickException(f"{len(pending)} schema migrations are pending; run 'flask db-upgrade' first")
+    if not no_warm_up:
+        warm_up(app)
+    recover_interrupted_work(app)
+    try:
+        serve(app, host, port, processes, threads, init_worker)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+# Render every public page into STATIC_EXPORT_DIR. Later content commits
+# re-render only the pages they affect.
+@click.command('export-site')
+@with_appcontext
+def export_site_command():
+    app = current_app._get_current_object()
+    if not app.config['STATIC_EXPORT_DIR']:
+        raise click.ClickException("Set STATIC_EXPORT_DIR to the directory to export to")
+    export_site(app)
+    print(f"Exported the public pages to {app.config['STATIC_EXPORT_DIR']}")
+
+# Commands added to the 'flask' CLI of every app
+COMMANDS = (
+    generate_image_variants, build_assets_command, build_vendor, build_critical_css_command,
+    dedupe_uploads, push_uploads_command, gc_files, send_outbox, db_stress, db_upgrade, serve_command,
+    export_site_command,
+)
+
+# Development server (run.bat)
+if __name__ == '__main__':
+    app = create_app()
+    init_db(app)
+    recover_interrupted_work(app)
+    start_background_services(app)
+    app.run(debug=app.config['APP_ENV'] == 'development', use_reloader=False)
\ No newline at end of file
@@ -1,4 +1,20 @@
+from blinker import Namespace
+from flask_login import LoginManager
+from flask_mail import Mail
 from flask_sqlalchemy import SQLAlchemy
+from flask_wtf.csrf import CSRFProtect
 
 # Create a global db instance to avoid circular imports
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+# The other extensions, bound to the app by create_app
+csrf = CSRFProtect()
+mail = Mail()
+login_manager = LoginManager()
+
+# Signals shared between the models and the caching layers
+signals = Namespace()
+
+# Sent after a commit that touched any public content table, with tables=frozenset of table names
+# and versions={table name: (version, updated_at)} for the new watermarks
+content_changed = signals.signal('content-changed')
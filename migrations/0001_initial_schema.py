@@ -0,0 +1,175 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text, text
+from sqlalchemy.exc import OperationalError
+
+# The schema as it stood before versioned migrations, frozen here so later
+# changes to the models never leak into it. Later migrations build on this.
+metadata = MetaData()
+
+Table('users', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('name', String(100), nullable=False),
+      Column('email', String(120), unique=True, nullable=False),
+      Column('password', String(200), nullable=False))
+
+Table('admin', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('email', String(120), unique=True, nullable=False),
+      Column('password', String(200), nullable=False))
+
+Table('projects', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('title', String(100), nullable=False),
+      Column('description', Text, nullable=False),
+      Column('image', String(100), nullable=False),
+      Column('link', String(200)))
+
+Table('skills', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('name', String(100), nullable=False),
+      Column('icon', String(20), nullable=False),
+      Column('image', String(100)))
+
+Table('certificates', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('title', String(100), nullable=False),
+      Column('image', String(100), nullable=False))
+
+Table('messages', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('name', String(100), nullable=False),
+      Column('email', String(120), nullable=False),
+      Column('message', Text, nullable=False),
+      Column('date', DateTime, nullable=False))
+
+Table('inbox_state', metadata,
+      Column('admin_id', Integer, ForeignKey('admin.id'), primary_key=True),
+      Column('last_read_at', DateTime, nullable=False))
+
+Table('outbox', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('message_id', Integer, ForeignKey('messages.id')),
+      Column('subject', String(200), nullable=False),
+      Column('recipients', Text, nullable=False),
+      Column('body', Text, nullable=False),
+      Column('status', String(20), nullable=False),
+      Column('attempts', Integer, nullable=False),
+      Column('next_attempt_at', DateTime, nullable=False),
+      Column('last_error', Text),
+      Column('created_at', DateTime, nullable=False),
+      Column('sent_at', DateTime),
+      Index('ix_outbox_status', 'status'))
+
+Table('resumes', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('filename', String(100), nullable=False),
+      Column('upload_date', DateTime, nullable=False))
+
+Table('site_images', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('name', String(100), unique=True, nullable=False),
+      Column('filename', String(100), nullable=False),
+      Column('upload_date', DateTime, nullable=False))
+
+Table('contact_info', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('email', String(120), nullable=False),
+      Column('phone', String(20)),
+      Column('location', String(200)),
+      Column('map_embed_url', Text))
+
+Table('education', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('degree', String(200), nullable=False),
+      Column('institution', String(200), nullable=False),
+      Column('start_date', String(20), nullable=False),
+      Column('end_date', String(20), nullable=False),
+      Column('description', Text),
+      Column('order', Integer, nullable=False),
+      Column('image', String(100)))
+
+Table('experience', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('position', String(200), nullable=False),
+      Column('company', String(200), nullable=False),
+      Column('start_date', String(20), nullable=False),
+      Column('end_date', String(20), nullable=False),
+      Column('description', Text),
+      Column('order', Integer, nullable=False))
+
+Table('image_derivatives', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('source', String(200), nullable=False),
+      Column('filename', String(200), nullable=False),
+      Column('format', String(10), nullable=False),
+      Column('width', Integer, nullable=False),
+      Column('height', Integer, nullable=False),
+      Index('ix_image_derivatives_source', 'source'))
+
+Table('jobs', metadata,
+      Column('id', Integer, primary_key=True),
+      Column('kind', String(50), nullable=False),
+      Column('payload', Text, nullable=False),
+      Column('status', String(20), nullable=False),
+      Column('attempts', Integer, nullable=False),
+      Column('error', Text),
+      Column('created_at', DateTime, nullable=False),
+      Column('finished_at', DateTime),
+      Index('ix_jobs_status', 'status'))
+
+Table('blobs', metadata,
+      Column('digest', String(64), primary_key=True),
+      Column('extension', String(10), nullable=False),
+      Column('size', Integer, nullable=False),
+      Column('refcount', Integer, nullable=False),
+      Column('created_at', DateTime, nullable=False))
+
+Table('content_versions', metadata,
+      Column('table_name', String(50), primary_key=True),
+      Column('version', Integer, nullable=False),
+      Column('updated_at', DateTime, nullable=False))
+
+# External-content FTS5 index over messages, kept in sync by triggers
+MESSAGE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE messages_fts USING fts5(
+        name, email, message, content='messages', content_rowid='id'
+    )""",
+    """CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, name, email, message) VALUES (new.id, new.name, new.email, new.message);
+    END""",
+    """CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, name, email, message) VALUES ('delete', old.id, old.name, old.email, old.message);
+    END""",
+    """CREATE TRIGGER messages_fts_update AFTER UPDATE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, name, email, message) VALUES ('delete', old.id, old.name, old.email, old.message);
+        INSERT INTO messages_fts(rowid, name, email, message) VALUES (new.id, new.name, new.email, new.message);
+    END""",
+    # Index the messages received before the table existed
+    "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+]
+
+
+def ensure_message_search(connection):
+    if connection.dialect.name != 'sqlite':
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+    ).first()
+    if exists:
+        return
+    try:
+        for statement in MESSAGE_SEARCH_DDL:
+            connection.execute(text(statement))
+    except OperationalError as e:
+        # SQLite built without FTS5; the inbox still works, search doesn't
+        print(f"Message search unavailable: {e}")
+
+
+# Databases from before migrations already have most of this, so every table
+# and index is created only if missing
+def upgrade(connection):
+    metadata.create_all(connection)
+    # create_all skips indexes declared on tables that already exist
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    ensure_message_search(connection)
@@ -0,0 +1,19 @@
+from sqlalchemy import inspect, text
+
+
+# Indexes for the queries behind every page view and login: the inbox sorted
+# by date, education and experience sorted by their order column, and the
+# account lookups by email
+def upgrade(connection):
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_messages_date ON messages (date)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_education_order ON education ("order")'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_experience_order ON experience ("order")'))
+
+    # The UNIQUE constraints on email already come with an index; only
+    # databases created without them need one
+    inspector = inspect(connection)
+    for table in ('users', 'admin'):
+        indexed = [index['column_names'] for index in inspector.get_indexes(table)]
+        indexed += [constraint['column_names'] for constraint in inspector.get_unique_constraints(table)]
+        if not any(columns[:1] == ['email'] for columns in indexed):
+            connection.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_email ON {table} (email)'))
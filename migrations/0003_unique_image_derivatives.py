@@ -0,0 +1,13 @@
+from sqlalchemy import text
+
+
+# One image_derivatives row per file. Jobs racing for the same image could
+# record a variant twice; keep the oldest row of each before adding the index.
+def upgrade(connection):
+    connection.execute(text(
+        'DELETE FROM image_derivatives WHERE id NOT IN '
+        '(SELECT MIN(id) FROM image_derivatives GROUP BY filename)'
+    ))
+    connection.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_image_derivatives_filename ON image_derivatives (filename)'
+    ))
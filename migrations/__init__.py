@@ -0,0 +1 @@
+# Schema migrations, applied in order by 'flask db-upgrade' (services/migrations.py)
@@ -1,9 +1,12 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from datetime import datetime
+from itertools import chain
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
 
 # Import db from a separate module to avoid circular imports
-from extensions import db
+from extensions import db, content_changed
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -14,11 +17,16 @@ class User(UserMixin, db.Model):
     password = db.Column(db.String(200), nullable=False)
     
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        from services.passwords import hash_password
+        self.password = hash_password(password)
         
     def check_password(self, password):
         return check_password_hash(self.password, password)
         
+    # Namespaced so admin and user ids never collide in the session
+    def get_id(self):
+        return f"user:{self.id}"
+        
     def __repr__(self):
         return f"User('{self.name}', '{self.email}')"
 
@@ -30,11 +38,16 @@ class Admin(UserMixin, db.Model):
     password = db.Column(db.String(200), nullable=False)
     
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        from services.passwords import hash_password
+        self.password = hash_password(password)
         
     def check_password(self, password):
         return check_password_hash(self.password, password)
         
+    # Namespaced so admin and user ids never collide in the session
+    def get_id(self):
+        return f"admin:{self.id}"
+        
     def __repr__(self):
         return f"Admin('{self.email}')"
 
@@ -44,7 +57,7 @@ class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    image = db.Column(db.String(20), nullable=False, default='default.jpg')
+    image = db.Column(db.String(100), nullable=False, default='default.jpg')
     link = db.Column(db.String(200), nullable=True)
     
     def __repr__(self):
@@ -66,7 +79,7 @@ class Certificate(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
-    image = db.Column(db.String(20), nullable=False, default='default.jpg')
+    image = db.Column(db.String(100), nullable=False, default='default.jpg')
     
     def __repr__(self):
         return f"Certificate('{self.title}')"
@@ -78,11 +91,40 @@ class Message(db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), nullable=False)
     message = db.Column(db.Text, nullable=False)
-    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f"Message('{self.name}', '{self.date}')"
 
+class InboxState(db.Model):
+    __tablename__ = 'inbox_state'
+    
+    admin_id = db.Column(db.Integer, db.ForeignKey('admin.id'), primary_key=True)
+    last_read_at = db.Column(db.DateTime, nullable=False)  # Messages dated after this are unread
+    
+    def __repr__(self):
+        return f"InboxState({self.admin_id}, '{self.last_read_at}')"
+
+class OutboxMessage(db.Model):
+    __tablename__ = 'outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=True)
+    subject = db.Column(db.String(200), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # Comma-separated addresses
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, sending, sent or dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    message = db.relationship('Message')
+    
+    def __repr__(self):
+        return f"OutboxMessage('{self.subject}', '{self.status}')"
+
 class Resume(db.Model):
     __tablename__ = 'resumes'
     
@@ -125,7 +167,7 @@ class Education(db.Model):
     start_date = db.Column(db.String(20), nullable=False)  # e.g., "2018"
     end_date = db.Column(db.String(20), nullable=False)    # e.g., "2022" or "Present"
     description = db.Column(db.Text, nullable=True)
-    order = db.Column(db.Integer, nullable=False, default=0)  # For ordering
+    order = db.Column(db.Integer, nullable=False, default=0, index=True)  # For ordering
     image = db.Column(db.String(100), nullable=True)  # Image filename
     
     def __repr__(self):
@@ -140,7 +182,111 @@ class Experience(db.Model):
     start_date = db.Column(db.String(20), nullable=False)  # e.g., "2022"
     end_date = db.Column(db.String(20), nullable=False)    # e.g., "2023" or "Present"
     description = db.Column(db.Text, nullable=True)
-    order = db.Column(db.Integer, nullable=False, default=0)  # For ordering
+    order = db.Column(db.Integer, nullable=False, default=0, index=True)  # For ordering
     
     def __repr__(self):
         return f"Experience('{self.position}', '{self.company}')"
+
+class ImageDerivative(db.Model):
+    __tablename__ = 'image_derivatives'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(200), nullable=False, index=True)  # Original, relative to static/, e.g. 'images/projects/abc.png'
+    filename = db.Column(db.String(200), nullable=False, unique=True, index=True)  # Resized copy, relative to static/
+    format = db.Column(db.String(10), nullable=False)  # e.g. 'avif', 'webp', 'jpeg', 'png'
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"ImageDerivative('{self.filename}', {self.width})"
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # Name of the registered handler, e.g. 'image_derivatives'
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments for the handler
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, running, done or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"Job('{self.kind}', '{self.status}')"
+
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+    
+    digest = db.Column(db.String(64), primary_key=True)  # SHA-256 of the contents; uploads are named <digest><extension>
+    extension = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)  # Rows whose filename column points at this blob
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"Blob('{self.digest}', {self.refcount})"
+
+class ContentVersion(db.Model):
+    __tablename__ = 'content_versions'
+    
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)  # Bumped on every commit touching the table
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"ContentVersion('{self.table_name}', {self.version})"
+
+# Models rendered on the public pages; commits touching them invalidate the caches
+CONTENT_MODELS = (Project, Skill, Certificate, Resume, SiteImage, ContactInfo, Education, Experience, ImageDerivative)
+
+@event.listens_for(Session, 'after_flush')
+def collect_content_changes(session, flush_context):
+    changed = session.info.setdefault('content_changed', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, CONTENT_MODELS):
+            changed.add(obj.__tablename__)
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_bulk_content_changes(orm_execute_state):
+    # Bulk statements such as Resume.query.delete() bypass the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, CONTENT_MODELS):
+            changed = orm_execute_state.session.info.setdefault('content_changed', set())
+            changed.add(mapper.class_.__tablename__)
+
+@event.listens_for(Session, 'before_commit')
+def bump_content_versions(session):
+    # Flush first so changes still pending in the session are collected too
+    session.flush()
+    changed = session.info.get('content_changed')
+    if not changed:
+        return
+    
+    # Bump the watermarks in the same transaction as the content change
+    now = datetime.utcnow()
+    for table_name in changed:
+        result = session.execute(
+            update(ContentVersion)
+            .where(ContentVersion.table_name == table_name)
+            .values(version=ContentVersion.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            session.add(ContentVersion(table_name=table_name, version=1, updated_at=now))
+    session.flush()
+    
+    rows = session.execute(select(ContentVersion).where(ContentVersion.table_name.in_(changed))).scalars()
+    session.info['content_versions'] = {row.table_name: (row.version, row.updated_at) for row in rows}
+
+@event.listens_for(Session, 'after_commit')
+def publish_content_changes(session):
+    changed = session.info.pop('content_changed', None)
+    versions = session.info.pop('content_versions', {})
+    if changed:
+        content_changed.send(session, tables=frozenset(changed), versions=versions)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_content_changes(session):
+    session.info.pop('content_changed', None)
+    session.info.pop('content_versions', None)
@@ -1,13 +1,43 @@
-from flask import render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, abort, jsonify
 from flask_login import login_user, current_user, logout_user, login_required
-from flask_mail import Message as MailMessage
-from app import app, db
-from models.models import User, Admin, Project, Skill, Certificate, Message, Resume, SiteImage, Education, Experience, ContactInfo
+from extensions import db
+from models.models import User, Admin, Project, Skill, Certificate, Message, Resume, SiteImage, Education, Experience, ContactInfo, ImageDerivative, InboxState
 from forms.forms import LoginForm, RegistrationForm, ProjectForm, SkillForm, CertificateForm, MessageForm, ResumeForm, SiteImageForm, EducationForm, ExperienceForm, ContactInfoForm
+from services.page_cache import cached_page, login_state
+from services.content_snapshot import get_snapshot, DEFAULT_CONTACT_INFO
+from services.content_version import conditional_page, content_versions
+from services.images import responsive_image
+from services.assets import asset_url
+from services.vendor import vendor_bundle
+from services.critical_css import critical_css
+from services.jobs import enqueue_once, job_status
+from services.mailer import queue_mail
+from services.rate_limit import check_contact_submission
+from services.pagination import keyset_paginate
+from services.search import search_messages
+from services.downloads import send_download
+from services.storage import get_storage
+from services.uploads import BLOB_DIR, remove_upload, store_upload, upload_in_use
+from services.passwords import authenticate, PasswordCheckBusy
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge, UnsupportedMediaType
 from functools import wraps
 from datetime import datetime
-import os
-import secrets
+
+# Every page of the site; registered on the app by create_app
+main = Blueprint('main', __name__)
+
+# Template helper for <picture>/srcset markup of uploaded images
+main.add_app_template_global(responsive_image)
+# Fingerprinted URLs for static files, used in place of url_for('static')
+main.add_app_template_global(asset_url)
+# Local vendor CSS/JS bundle instead of the CDN links once it has been built
+main.add_app_template_global(vendor_bundle)
+# Inlined above-the-fold CSS for the public pages
+main.add_app_template_global(critical_css)
+# Cache key for fragments that differ by who is logged in
+main.add_app_template_global(login_state)
 
 # Admin required decorator
 def admin_required(f):
@@ -15,26 +45,42 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or not isinstance(current_user, Admin):
             flash('Access denied. Admins only.', 'danger')
-            return redirect(url_for('home'))
+            return redirect(url_for('main.home'))
         return f(*args, **kwargs)
     return decorated_function
 
+# Password checks are capped; past the cap ask the visitor to retry shortly
+def busy_login_response(form=None):
+    flash('Too many login attempts right now. Please try again in a moment.', 'danger')
+    return render_template('login.html', form=form or LoginForm()), 503, {'Retry-After': '5'}
+
+# Uploads refused while the form was parsed (too large, or not the file type
+# the extension claims); send the admin back to the form with the reason
+@main.app_errorhandler(RequestEntityTooLarge)
+@main.app_errorhandler(UnsupportedMediaType)
+def upload_refused(error):
+    flash(error.description, 'danger')
+    return redirect(request.url)
+
 # Direct admin access route with basic authentication
-@app.route("/home/admin/", methods=['GET', 'POST'])
+@main.route("/home/admin/", methods=['GET', 'POST'])
 def direct_admin_access():
     # Check if user is already authenticated as admin
     if current_user.is_authenticated and isinstance(current_user, Admin):
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     
     # Check for basic auth credentials
     auth = request.authorization
     if auth:
         # Validate admin credentials
-        admin = Admin.query.filter_by(email=auth.username).first()
-        if admin and admin.check_password(auth.password):
+        try:
+            admin = authenticate(auth.username, auth.password, kinds=('admin',))
+        except PasswordCheckBusy:
+            return busy_login_response()
+        if admin:
             login_user(admin)
             flash('Login successful!', 'success')
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
         else:
             flash('Invalid credentials')
     
@@ -43,140 +89,119 @@ def direct_admin_access():
     return (render_template('login.html', form=LoginForm()), 401, headers)
 
 # Home route
-@app.route("/")
-@app.route("/home")
+@main.route("/")
+@main.route("/home")
+@conditional_page(SiteImage, ImageDerivative)
+@cached_page
 def home():
     # Get site images for template
-    site_images = {}
-    for img in SiteImage.query.all():
-        site_images[img.name] = img
+    snapshot = get_snapshot()
     
-    return render_template('home.html', site_images=site_images)
+    return render_template('home.html', site_images=snapshot.site_images)
 
 # About route
-@app.route("/about")
+@main.route("/about")
+@conditional_page(SiteImage, Education, Experience, ImageDerivative)
+@cached_page
 def about():
-    # Get site images for template
-    site_images = {}
-    for img in SiteImage.query.all():
-        site_images[img.name] = img
-    
-    # Get education and experience items
-    education_items = Education.query.order_by(Education.order).all()
-    experience_items = Experience.query.order_by(Experience.order).all()
+    # Site images, education and experience items all come from the content snapshot
+    snapshot = get_snapshot()
     
     return render_template('about.html', 
-                         site_images=site_images,
-                         education_items=education_items,
-                         experience_items=experience_items)
+                         site_images=snapshot.site_images,
+                         education_items=snapshot.education_items,
+                         experience_items=snapshot.experience_items)
 
 # Projects route
-@app.route("/projects")
+@main.route("/projects")
+@conditional_page(Project, ImageDerivative)
+@cached_page
 def projects():
     projects = Project.query.all()
     return render_template('projects.html', projects=projects)
 
 # Skills route
-@app.route("/skills")
+@main.route("/skills")
+@conditional_page(Skill, ImageDerivative)
+@cached_page
 def skills():
     skills = Skill.query.all()
     return render_template('skills.html', skills=skills)
 
 # Certificates route
-@app.route("/certificates")
+@main.route("/certificates")
+@conditional_page(Certificate, ImageDerivative)
+@cached_page
 def certificates():
     certificates = Certificate.query.all()
     return render_template('certificates.html', certificates=certificates)
 
 # Contact route
-@app.route("/contact", methods=['GET', 'POST'])
+@main.route("/contact", methods=['GET', 'POST'])
 def contact():
-    # Get contact information
-    contact_info = ContactInfo.query.first()
-    if not contact_info:
-        # Create default contact info if none exists
-        contact_info = ContactInfo(
-            email='chidanandkhot2@gmail.com',
-            phone='',
-            location='City, Country',
-            map_embed_url='https://www.google.com/maps/embed?pb=!1m18!1m12!1m3!1d3001156.428151844!2d-78.01059036852154!3d42.72837739473232!2m3!1f0!2f0!3f0!3m2!1i1024!2i768!4f13.1!3m3!1m2!1s0x4ccc4bf0f123a5a9%3A0xddcfc6c1de189567!2sNew%20York%2C%20USA!5e0!3m2!1sen!2sus!4v1690923407186!5m2!1sen!2sus'
-        )
-        db.session.add(contact_info)
-        db.session.commit()
-    
-    form = MessageForm()
+    # Notice contact info saved by other workers; notifications go to its email
+    content_versions.poll()
+    # Get contact information (falls back to the defaults until the admin saves some)
+    contact_info = get_snapshot().contact_info
+    
+    # Exported contact pages are shared by every visitor, so they can't carry a per-session CSRF token
+    if current_app.config.get('STATIC_EXPORT_DIR'):
+        form = MessageForm(meta={'csrf': False})
+    else:
+        form = MessageForm()
     if form.validate_on_submit():
+        # Reject floods and duplicate submissions before touching the database or mail relay.
+        # remote_addr is the visitor's address once TRUSTED_PROXIES is set behind a proxy.
+        rejection = check_contact_submission(request.remote_addr, form.email.data, form.message.data)
+        if rejection:
+            flash(rejection, 'danger')
+            return render_template('contact.html', form=form, contact_info=contact_info), 429
+        
         message = Message()
         message.name = form.name.data
         message.email = form.email.data
         message.message = form.message.data
         db.session.add(message)
-        db.session.commit()
         
-        # Send email notification
-        try:
-            from app import mail
-            msg = MailMessage(
-                subject=f'New Contact Message from {form.name.data}',
-                recipients=[contact_info.email],
-                body=f'''Name: {form.name.data}
+        # Queue the email notification in the same transaction as the message
+        queue_mail(
+            subject=f'New Contact Message from {form.name.data}',
+            recipients=[contact_info.email],
+            body=f'''Name: {form.name.data}
 Email: {form.email.data}
 
 Message:
-{form.message.data}'''
-            )
-            mail.send(msg)
-            flash('Your message has been sent successfully! I will get back to you soon.', 'success')
-        except Exception as e:
-            print(f"Email error: {e}")
-            flash('Your message has been saved! (Email notification failed, but message is recorded)', 'info')
+{form.message.data}''',
+            message=message
+        )
+        db.session.commit()
+        flash('Your message has been sent successfully! I will get back to you soon.', 'success')
         
-        return redirect(url_for('contact'))
+        return redirect(url_for('main.contact'))
     return render_template('contact.html', form=form, contact_info=contact_info)
 
 # Login route
-@app.route("/login", methods=['GET', 'POST'])
+@main.route("/login", methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         if isinstance(current_user, Admin):
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
         else:
-            return redirect(url_for('home'))
+            return redirect(url_for('main.home'))
     
     form = LoginForm()
-    print(f"Request method: {request.method}")
-    print(f"Form data: {form.data}")
-    
-    # Check if form is submitted
     if request.method == 'POST':
-        print("Processing POST request")
-        print(f"Form validation: {form.validate()}")
-        print(f"Form errors: {form.errors}")
-        
-        # Even if form validation fails, let's try to process the login
-        # This is for debugging purposes only
-        email = request.form.get('email')
-        password = request.form.get('password')
-        
-        print(f"Raw form data - Email: {email}, Password: {password}")
-        
-        if email and password:
-            # Check if it's an admin login
-            admin = Admin.query.filter_by(email=email).first()
-            if admin and admin.check_password(password):
-                login_user(admin)
+        if form.validate_on_submit():
+            try:
+                principal = authenticate(form.email.data, form.password.data)
+            except PasswordCheckBusy:
+                return busy_login_response(form)
+            if principal:
+                login_user(principal)
                 flash('Login successful!', 'success')
                 next_page = request.args.get('next')
-                return redirect(next_page) if next_page else redirect(url_for('admin_dashboard'))
-            
-            # Check if it's a user login
-            user = User.query.filter_by(email=email).first()
-            if user and user.check_password(password):
-                login_user(user)
-                flash('Login successful!', 'success')
-                next_page = request.args.get('next')
-                return redirect(next_page) if next_page else redirect(url_for('home'))
-            
+                default_page = 'main.admin_dashboard' if isinstance(principal, Admin) else 'main.home'
+                return redirect(next_page) if next_page else redirect(url_for(default_page))
             flash('Login unsuccessful. Please check email and password', 'danger')
         else:
             flash('Please provide both email and password', 'danger')
@@ -184,10 +209,10 @@ def login():
     return render_template('login.html', form=form)
 
 # Registration route
-@app.route("/register", methods=['GET', 'POST'])
+@main.route("/register", methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
     form = RegistrationForm()
     if form.validate_on_submit():
@@ -198,19 +223,19 @@ def register():
         db.session.add(user)
         db.session.commit()
         flash('Registration successful!', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('register.html', form=form)
 
 # Logout route
-@app.route("/logout")
+@main.route("/logout")
 def logout():
     logout_user()
     flash('You have been logged out!', 'info')
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
 # Admin dashboard route
-@app.route("/admin/dashboard")
+@main.route("/admin/dashboard")
 @login_required
 @admin_required
 def admin_dashboard():
@@ -227,7 +252,7 @@ def admin_dashboard():
                           message_count=message_count)
 
 # Admin projects route
-@app.route("/admin/projects")
+@main.route("/admin/projects")
 @login_required
 @admin_required
 def admin_projects():
@@ -235,8 +260,8 @@ def admin_projects():
     return render_template('admin/projects.html', projects=projects)
 
 # Admin add/edit project route
-@app.route("/admin/projects/new", methods=['GET', 'POST'])
-@app.route("/admin/projects/<int:project_id>/update", methods=['GET', 'POST'])
+@main.route("/admin/projects/new", methods=['GET', 'POST'])
+@main.route("/admin/projects/<int:project_id>/update", methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_project_form(project_id=None):
@@ -255,19 +280,9 @@ def admin_project_form(project_id=None):
         
         # Handle image upload
         if form.image.data:
-            # Create projects directory if it doesn't exist
-            projects_dir = os.path.join(app.root_path, 'static', 'images', 'projects')
-            if not os.path.exists(projects_dir):
-                os.makedirs(projects_dir)
-            
-            # Generate unique filename
-            random_hex = secrets.token_hex(8)
-            _, f_ext = os.path.splitext(form.image.data.filename)
-            image_filename = random_hex + f_ext
-            image_path = os.path.join(projects_dir, image_filename)
-            
-            # Save the image
-            form.image.data.save(image_path)
+            # Store the image by content hash
+            image_filename = store_upload(form.image.data, 'images/projects')
+            enqueue_once('image_derivatives', source='images/projects/' + image_filename)
             project.image = image_filename
         
         if project_id is None:
@@ -275,7 +290,7 @@ def admin_project_form(project_id=None):
         
         db.session.commit()
         flash('Project saved successfully!', 'success')
-        return redirect(url_for('admin_projects'))
+        return redirect(url_for('main.admin_projects'))
     
     elif request.method == 'GET' and project:
         form.title.data = project.title
@@ -285,7 +300,7 @@ def admin_project_form(project_id=None):
     return render_template('admin/project_form.html', form=form, project=project)
 
 # Admin delete project route
-@app.route("/admin/projects/<int:project_id>/delete", methods=['POST'])
+@main.route("/admin/projects/<int:project_id>/delete", methods=['POST'])
 @login_required
 @admin_required
 def delete_project(project_id):
@@ -293,10 +308,10 @@ def delete_project(project_id):
     db.session.delete(project)
     db.session.commit()
     flash('Project deleted successfully!', 'success')
-    return redirect(url_for('admin_projects'))
+    return redirect(url_for('main.admin_projects'))
 
 # Admin skills route
-@app.route("/admin/skills")
+@main.route("/admin/skills")
 @login_required
 @admin_required
 def admin_skills():
@@ -304,8 +319,8 @@ def admin_skills():
     return render_template('admin/skills.html', skills=skills)
 
 # Admin add/edit skill route
-@app.route("/admin/skills/new", methods=['GET', 'POST'])
-@app.route("/admin/skills/<int:skill_id>/update", methods=['GET', 'POST'])
+@main.route("/admin/skills/new", methods=['GET', 'POST'])
+@main.route("/admin/skills/<int:skill_id>/update", methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_skill_form(skill_id=None):
@@ -322,19 +337,9 @@ def admin_skill_form(skill_id=None):
         
         # Handle image upload
         if form.image.data:
-            # Create skills directory if it doesn't exist
-            skills_dir = os.path.join(app.root_path, 'static', 'images', 'skills')
-            if not os.path.exists(skills_dir):
-                os.makedirs(skills_dir)
-            
-            # Generate unique filename
-            random_hex = secrets.token_hex(8)
-            _, f_ext = os.path.splitext(form.image.data.filename)
-            image_filename = random_hex + f_ext
-            image_path = os.path.join(skills_dir, image_filename)
-            
-            # Save the image
-            form.image.data.save(image_path)
+            # Store the image by content hash
+            image_filename = store_upload(form.image.data, 'images/skills')
+            enqueue_once('image_derivatives', source='images/skills/' + image_filename)
             skill.image = image_filename
         
         if skill_id is None:
@@ -342,7 +347,7 @@ def admin_skill_form(skill_id=None):
         
         db.session.commit()
         flash('Skill saved successfully!', 'success')
-        return redirect(url_for('admin_skills'))
+        return redirect(url_for('main.admin_skills'))
     
     elif request.method == 'GET' and skill:
         form.name.data = skill.name
@@ -350,7 +355,7 @@ def admin_skill_form(skill_id=None):
     return render_template('admin/skill_form.html', form=form, skill=skill)
 
 # Admin delete skill route
-@app.route("/admin/skills/<int:skill_id>/delete", methods=['POST'])
+@main.route("/admin/skills/<int:skill_id>/delete", methods=['POST'])
 @login_required
 @admin_required
 def delete_skill(skill_id):
@@ -358,10 +363,10 @@ def delete_skill(skill_id):
     db.session.delete(skill)
     db.session.commit()
     flash('Skill deleted successfully!', 'success')
-    return redirect(url_for('admin_skills'))
+    return redirect(url_for('main.admin_skills'))
 
 # Admin certificates route
-@app.route("/admin/certificates")
+@main.route("/admin/certificates")
 @login_required
 @admin_required
 def admin_certificates():
@@ -369,8 +374,8 @@ def admin_certificates():
     return render_template('admin/certificates.html', certificates=certificates)
 
 # Admin add/edit certificate route
-@app.route("/admin/certificates/new", methods=['GET', 'POST'])
-@app.route("/admin/certificates/<int:certificate_id>/update", methods=['GET', 'POST'])
+@main.route("/admin/certificates/new", methods=['GET', 'POST'])
+@main.route("/admin/certificates/<int:certificate_id>/update", methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_certificate_form(certificate_id=None):
@@ -387,19 +392,9 @@ def admin_certificate_form(certificate_id=None):
         
         # Handle image upload
         if form.image.data:
-            # Create certificates directory if it doesn't exist
-            cert_dir = os.path.join(app.root_path, 'static', 'images', 'certificates')
-            if not os.path.exists(cert_dir):
-                os.makedirs(cert_dir)
-            
-            # Generate unique filename
-            random_hex = secrets.token_hex(8)
-            _, f_ext = os.path.splitext(form.image.data.filename)
-            image_filename = random_hex + f_ext
-            image_path = os.path.join(cert_dir, image_filename)
-            
-            # Save the image
-            form.image.data.save(image_path)
+            # Store the image by content hash
+            image_filename = store_upload(form.image.data, 'images/certificates')
+            enqueue_once('image_derivatives', source='images/certificates/' + image_filename)
             certificate.image = image_filename
         
         if certificate_id is None:
@@ -407,7 +402,7 @@ def admin_certificate_form(certificate_id=None):
         
         db.session.commit()
         flash('Certificate saved successfully!', 'success')
-        return redirect(url_for('admin_certificates'))
+        return redirect(url_for('main.admin_certificates'))
     
     elif request.method == 'GET' and certificate:
         form.title.data = certificate.title
@@ -415,7 +410,7 @@ def admin_certificate_form(certificate_id=None):
     return render_template('admin/certificate_form.html', form=form, certificate=certificate)
 
 # Admin delete certificate route
-@app.route("/admin/certificates/<int:certificate_id>/delete", methods=['POST'])
+@main.route("/admin/certificates/<int:certificate_id>/delete", methods=['POST'])
 @login_required
 @admin_required
 def delete_certificate(certificate_id):
@@ -423,18 +418,65 @@ def delete_certificate(certificate_id):
     db.session.delete(certificate)
     db.session.commit()
     flash('Certificate deleted successfully!', 'success')
-    return redirect(url_for('admin_certificates'))
+    return redirect(url_for('main.admin_certificates'))
 
 # Admin messages route
-@app.route("/admin/messages")
+@main.route("/admin/messages")
 @login_required
 @admin_required
 def admin_messages():
-    messages = Message.query.order_by(Message.date.desc()).all()
-    return render_template('admin/messages.html', messages=messages)
+    # Clamped to 1..100: SQLite reads a negative LIMIT as no limit at all
+    per_page = max(1, min(request.args.get('per_page', current_app.config['ADMIN_MESSAGES_PER_PAGE'], type=int), 100))
+    before = request.args.get('before')
+    after = request.args.get('after')
+    page = keyset_paginate(Message.query, Message.date, Message.id, per_page, before=before, after=after)
+    
+    # Counts come from the index without loading any message rows
+    inbox = db.session.get(InboxState, current_user.id)
+    last_read_at = inbox.last_read_at if inbox else None
+    total_count = db.session.query(func.count(Message.id)).scalar()
+    unread_count = total_count
+    if last_read_at:
+        unread_count = db.session.query(func.count(Message.id)).filter(Message.date > last_read_at).scalar()
+    
+    # Viewing the newest page marks everything up to its first message as read
+    if not before and not after and page.items and (last_read_at is None or page.items[0].date > last_read_at):
+        if inbox is None:
+            inbox = InboxState(admin_id=current_user.id)
+            db.session.add(inbox)
+        inbox.last_read_at = page.items[0].date
+        db.session.commit()
+    
+    return render_template('admin/messages.html', messages=page.items, page=page, per_page=per_page,
+                           total_count=total_count, unread_count=unread_count, last_read_at=last_read_at)
+
+# Admin message search route
+@main.route("/admin/messages/search")
+@login_required
+@admin_required
+def admin_message_search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return redirect(url_for('main.admin_messages'))
+    
+    try:
+        messages, snippets = search_messages(query)
+    except OperationalError:
+        db.session.rollback()
+        flash('Message search is not available on this database.', 'danger')
+        return redirect(url_for('main.admin_messages'))
+    
+    return render_template('admin/messages.html', messages=messages, snippets=snippets, query=query)
+
+# Admin background job status, polled by the admin panel while uploads are processed
+@main.route("/admin/jobs")
+@login_required
+@admin_required
+def admin_jobs():
+    return jsonify(job_status())
 
 # Admin resume upload route
-@app.route("/admin/resume", methods=['GET', 'POST'])
+@main.route("/admin/resume", methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_resume():
@@ -445,24 +487,13 @@ def admin_resume():
             # Get the uploaded file
             file = form.resume.data
             
-            # Create the files directory if it doesn't exist
-            files_dir = os.path.join(app.root_path, 'static', 'files')
-            if not os.path.exists(files_dir):
-                os.makedirs(files_dir)
-            
-            # Generate a random filename to avoid conflicts
-            random_hex = secrets.token_hex(8)
-            _, f_ext = os.path.splitext(file.filename)
-            resume_filename = random_hex + f_ext
-            
-            # Define the path to save the file
-            resume_path = os.path.join(files_dir, resume_filename)
+            # Store the file by content hash; re-uploading the same PDF costs no space
+            resume_filename = store_upload(file, 'files')
             
-            # Save the file
-            file.save(resume_path)
-            
-            # Delete any existing resume records (keep only the latest)
-            Resume.query.delete()
+            # Delete any existing resume records (keep only the latest), one by
+            # one so the blob reference counts see them
+            for old_resume in Resume.query.all():
+                db.session.delete(old_resume)
             
             # Create new resume record
             resume = Resume(filename=resume_filename)
@@ -470,7 +501,7 @@ def admin_resume():
             db.session.commit()
             
             flash('Resume uploaded successfully!', 'success')
-            return redirect(url_for('admin_resume'))
+            return redirect(url_for('main.admin_resume'))
     
     # Get the current resume for display
     current_resume = Resume.query.first()
@@ -478,19 +509,34 @@ def admin_resume():
     return render_template('admin/resume.html', form=form, current_resume=current_resume)
 
 # Download resume route
-@app.route("/download-resume")
+@main.route("/download-resume")
 def download_resume():
-    from flask import send_file
-    resume = Resume.query.first()
+    # Notice uploads made by other workers before trusting the snapshot
+    content_versions.poll()
+    resume = get_snapshot().resume
     if resume:
-        file_path = os.path.join(app.root_path, 'static', 'files', resume.filename)
-        if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True, download_name='Chidanand_Khot_Resume.pdf')
+        try:
+            return send_download('files/' + resume.filename, 'Chidanand_Khot_Resume.pdf')
+        except NotFound:
+            pass
     flash('Resume not found!', 'danger')
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
+
+# Uploads in remote storage without a public URL: pages link here and get
+# redirected to a fresh presigned URL, so the bytes never pass through the app
+@main.route("/media/<path:key>")
+def media(key):
+    storage = get_storage()
+    if storage.local or key.split('/', 1)[0] not in (BLOB_DIR, 'images', 'files'):
+        abort(404)
+    response = redirect(storage.url(key))
+    # Browsers reuse the redirect for half the lifetime of the URL it points to
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['STORAGE_URL_EXPIRES'] // 2
+    return response
 
 # Admin image management route
-@app.route("/admin/images", methods=['GET', 'POST'])
+@main.route("/admin/images", methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_images():
@@ -511,7 +557,7 @@ def admin_images():
     return render_template('admin/images.html', image_types=image_types, current_images=current_images)
 
 # Admin upload image route
-@app.route("/admin/images/upload/<image_type>", methods=['GET', 'POST'])
+@main.route("/admin/images/upload/<image_type>", methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_upload_image(image_type):
@@ -523,48 +569,38 @@ def admin_upload_image(image_type):
     
     if image_type not in image_types:
         flash('Invalid image type!', 'danger')
-        return redirect(url_for('admin_images'))
+        return redirect(url_for('main.admin_images'))
     
     form = SiteImageForm()
     if form.validate_on_submit():
         if form.image.data:
-            # Create images directory if it doesn't exist
-            images_dir = os.path.join(app.root_path, 'static', 'images')
-            if not os.path.exists(images_dir):
-                os.makedirs(images_dir)
-            
-            # Generate unique filename
-            random_hex = secrets.token_hex(8)
-            _, f_ext = os.path.splitext(form.image.data.filename)
-            image_filename = random_hex + f_ext
-            image_path = os.path.join(images_dir, image_filename)
-            
-            # Save the image
-            form.image.data.save(image_path)
+            # Store the image by content hash and queue its resized variants
+            image_filename = store_upload(form.image.data, 'images')
+            enqueue_once('image_derivatives', source='images/' + image_filename)
             
             # Update or create database record
             site_image = SiteImage.query.filter_by(name=image_type).first()
             if site_image:
-                # Delete old image file
-                old_path = os.path.join(images_dir, site_image.filename)
-                if os.path.exists(old_path):
-                    os.remove(old_path)
+                old_filename = site_image.filename
                 site_image.filename = image_filename
                 site_image.upload_date = datetime.utcnow()
+                # Delete old image file unless another image has the same content
+                if old_filename != image_filename and not upload_in_use('images', old_filename):
+                    remove_upload('images', old_filename)
             else:
                 site_image = SiteImage(name=image_type, filename=image_filename)
                 db.session.add(site_image)
             
             db.session.commit()
             flash(f'{image_types[image_type]} uploaded successfully!', 'success')
-            return redirect(url_for('admin_images'))
+            return redirect(url_for('main.admin_images'))
     
     current_image = SiteImage.query.filter_by(name=image_type).first()
     return render_template('admin/image_upload.html', form=form, image_type=image_type, 
                          image_name=image_types[image_type], current_image=current_image)
 
 # Admin delete site image route
-@app.route("/admin/images/<image_type>/delete", methods=['POST'])
+@main.route("/admin/images/<image_type>/delete", methods=['POST'])
 @login_required
 @admin_required
 def delete_site_image(image_type):
@@ -576,34 +612,34 @@ def delete_site_image(image_type):
     
     if image_type not in image_types:
         flash('Invalid image type!', 'danger')
-        return redirect(url_for('admin_images'))
+        return redirect(url_for('main.admin_images'))
     
     site_image = SiteImage.query.filter_by(name=image_type).first()
     if site_image:
-        # Delete the image file
-        image_path = os.path.join(app.root_path, 'static', 'images', site_image.filename)
-        if os.path.exists(image_path):
-            os.remove(image_path)
-        
         # Delete the database record
+        filename = site_image.filename
         db.session.delete(site_image)
+        
+        # Delete the image file unless another image has the same content
+        if not upload_in_use('images', filename):
+            remove_upload('images', filename)
         db.session.commit()
         flash(f'{image_types[image_type]} deleted successfully!', 'success')
     else:
         flash('Image not found!', 'danger')
     
-    return redirect(url_for('admin_images'))
+    return redirect(url_for('main.admin_images'))
 
 # Admin education routes
-@app.route("/admin/education")
+@main.route("/admin/education")
 @login_required
 @admin_required
 def admin_education():
     education_items = Education.query.order_by(Education.order).all()
     return render_template('admin/education.html', education_items=education_items)
 
-@app.route("/admin/education/new", methods=['GET', 'POST'])
-@app.route("/admin/education/<int:education_id>/update", methods=['GET', 'POST'])
+@main.route("/admin/education/new", methods=['GET', 'POST'])
+@main.route("/admin/education/<int:education_id>/update", methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_education_form(education_id=None):
@@ -625,19 +661,9 @@ def admin_education_form(education_id=None):
         
         # Handle image upload
         if form.image.data:
-            # Create education directory if it doesn't exist
-            edu_dir = os.path.join(app.root_path, 'static', 'images', 'education')
-            if not os.path.exists(edu_dir):
-                os.makedirs(edu_dir)
-            
-            # Generate unique filename
-            random_hex = secrets.token_hex(8)
-            _, f_ext = os.path.splitext(form.image.data.filename)
-            image_filename = random_hex + f_ext
-            image_path = os.path.join(edu_dir, image_filename)
-            
-            # Save the image
-            form.image.data.save(image_path)
+            # Store the image by content hash
+            image_filename = store_upload(form.image.data, 'images/education')
+            enqueue_once('image_derivatives', source='images/education/' + image_filename)
             education.image = image_filename
         
         if education_id is None:
@@ -645,7 +671,7 @@ def admin_education_form(education_id=None):
         
         db.session.commit()
         flash('Education item saved successfully!', 'success')
-        return redirect(url_for('admin_education'))
+        return redirect(url_for('main.admin_education'))
     
     elif request.method == 'GET' and education:
         form.degree.data = education.degree
@@ -657,7 +683,7 @@ def admin_education_form(education_id=None):
     
     return render_template('admin/education_form.html', form=form, education=education)
 
-@app.route("/admin/education/<int:education_id>/delete", methods=['POST'])
+@main.route("/admin/education/<int:education_id>/delete", methods=['POST'])
 @login_required
 @admin_required
 def delete_education(education_id):
@@ -665,18 +691,18 @@ def delete_education(education_id):
     db.session.delete(education)
     db.session.commit()
     flash('Education item deleted successfully!', 'success')
-    return redirect(url_for('admin_education'))
+    return redirect(url_for('main.admin_education'))
 
 # Admin experience routes
-@app.route("/admin/experience")
+@main.route("/admin/experience")
 @login_required
 @admin_required
 def admin_experience():
     experience_items = Experience.query.order_by(Experience.order).all()
     return render_template('admin/experience.html', experience_items=experience_items)
 
-@app.route("/admin/experience/new", methods=['GET', 'POST'])
-@app.route("/admin/experience/<int:experience_id>/update", methods=['GET', 'POST'])
+@main.route("/admin/experience/new", methods=['GET', 'POST'])
+@main.route("/admin/experience/<int:experience_id>/update", methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_experience_form(experience_id=None):
@@ -701,7 +727,7 @@ def admin_experience_form(experience_id=None):
         
         db.session.commit()
         flash('Experience item saved successfully!', 'success')
-        return redirect(url_for('admin_experience'))
+        return redirect(url_for('main.admin_experience'))
     
     elif request.method == 'GET' and experience:
         form.position.data = experience.position
@@ -713,7 +739,7 @@ def admin_experience_form(experience_id=None):
     
     return render_template('admin/experience_form.html', form=form, experience=experience)
 
-@app.route("/admin/experience/<int:experience_id>/delete", methods=['POST'])
+@main.route("/admin/experience/<int:experience_id>/delete", methods=['POST'])
 @login_required
 @admin_required
 def delete_experience(experience_id):
@@ -721,10 +747,10 @@ def delete_experience(experience_id):
     db.session.delete(experience)
     db.session.commit()
     flash('Experience item deleted successfully!', 'success')
-    return redirect(url_for('admin_experience'))
+    return redirect(url_for('main.admin_experience'))
 
 # Admin contact info routes
-@app.route("/admin/contact", methods=['GET', 'POST'])
+@main.route("/admin/contact", methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_contact_info():
@@ -733,12 +759,7 @@ def admin_contact_info():
     
     # If no contact info exists, create a default one
     if not contact_info:
-        contact_info = ContactInfo(
-            email='chidanandkhot2@gmail.com',
-            phone='',
-            location='City, Country',
-            map_embed_url='https://www.google.com/maps/embed?pb=!1m18!1m12!1m3!1d3001156.428151844!2d-78.01059036852154!3d42.72837739473232!2m3!1f0!2f0!3f0!3m2!1i1024!2i768!4f13.1!3m3!1m2!1s0x4ccc4bf0f123a5a9%3A0xddcfc6c1de189567!2sNew%20York%2C%20USA!5e0!3m2!1sen!2sus!4v1690923407186!5m2!1sen!2sus'
-        )
+        contact_info = ContactInfo(**DEFAULT_CONTACT_INFO)
         db.session.add(contact_info)
         db.session.commit()
     
@@ -751,7 +772,7 @@ def admin_contact_info():
         
         db.session.commit()
         flash('Contact information updated successfully!', 'success')
-        return redirect(url_for('admin_contact_info'))
+        return redirect(url_for('main.admin_contact_info'))
     
     elif request.method == 'GET':
         form.email.data = contact_info.email
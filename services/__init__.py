@@ -0,0 +1 @@
+# Services package initializer
\ No newline at end of file
@@ -0,0 +1,219 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import threading
+
+import brotli
+from flask import current_app, request, send_from_directory, url_for
+
+# Directories under static/ that are fingerprinted; resumes under files/ are served as they are
+ASSET_DIRS = ('css', 'js', 'images')
+
+# Build output, relative to static/
+BUILD_DIR = 'dist'
+
+# Text formats worth precompressing; images are already compressed
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.map'}
+
+# Precompressed variants in order of preference: (Content-Encoding, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+FAR_FUTURE = 31536000  # One year
+
+
+# Logical static path (e.g. "css/style.css") -> fingerprinted copy under dist/,
+# persisted as dist/manifest.json so other processes can reuse the build
+class AssetManifest:
+    def __init__(self):
+        self.entries = {}  # path -> {'file': hashed path, 'mtime': ..., 'size': ...}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def path(self):
+        return os.path.join(current_app.static_folder, BUILD_DIR, 'manifest.json')
+
+    def load(self):
+        with self._lock:
+            if self.loaded:
+                return
+            try:
+                with open(self.path()) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+            self.loaded = True
+
+    def save(self):
+        with self._lock:
+            path = self.path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(temp_path, path)
+
+    def get(self, filename):
+        return self.entries.get(filename)
+
+    def set(self, filename, entry):
+        with self._lock:
+            self.entries[filename] = entry
+
+    def discard(self, filename):
+        with self._lock:
+            return self.entries.pop(filename, None)
+
+
+manifest = AssetManifest()
+
+
+# Absolute path of a file given relative to static/ with forward slashes
+def static_path(filename):
+    return os.path.join(current_app.static_folder, *filename.split('/'))
+
+
+def is_asset(filename):
+    return filename.split('/', 1)[0] in ASSET_DIRS
+
+
+# SHA-256 of a file's contents as hex, read in chunks
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_current(entry, stat):
+    return entry is not None and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size \
+        and os.path.exists(static_path(entry['file']))
+
+
+def write_compressed(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    with open(path + '.br', 'wb') as f:
+        f.write(brotli.compress(data, quality=11))
+
+
+def remove_built(entry):
+    path = static_path(entry['file'])
+    for suffix in ('', '.gz', '.br'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+# Fingerprint one static file into dist/ and return its manifest entry.
+# Unchanged files (same mtime and size) are skipped.
+def build_asset(filename):
+    path = static_path(filename)
+    stat = os.stat(path)
+    entry = manifest.get(filename)
+    if is_current(entry, stat):
+        return entry
+
+    stem, ext = os.path.splitext(filename)
+    hashed = f"{BUILD_DIR}/{stem}.{file_hash(path)[:12]}{ext}"
+    hashed_path = static_path(hashed)
+    if not os.path.exists(hashed_path):
+        os.makedirs(os.path.dirname(hashed_path), exist_ok=True)
+        if ext.lower() in COMPRESSIBLE:
+            # Stylesheets and scripts may be edited in place, so they get a real copy
+            shutil.copy2(path, hashed_path)
+            write_compressed(hashed_path)
+        else:
+            try:
+                # Uploads are never rewritten and can be large; a hard link costs no extra space
+                os.link(path, hashed_path)
+            except FileExistsError:
+                # Built by a concurrent request
+                pass
+            except OSError:
+                shutil.copy2(path, hashed_path)
+
+    # Earlier builds stay in place for pages that still link them
+    entry = {'file': hashed, 'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+    manifest.set(filename, entry)
+    return entry
+
+
+# Fingerprint everything under ASSET_DIRS and drop entries for deleted files
+def build_assets():
+    manifest.load()
+    found = set()
+    for directory in ASSET_DIRS:
+        root = os.path.join(current_app.static_folder, directory)
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                relative = os.path.relpath(os.path.join(dirpath, name), current_app.static_folder)
+                found.add(relative.replace(os.sep, '/'))
+
+    for filename in sorted(found):
+        build_asset(filename)
+    for filename in set(manifest.entries) - found:
+        remove_built(manifest.discard(filename))
+    manifest.save()
+    return len(found)
+
+
+# Forget a static file that was deleted (e.g. a replaced upload) along with its built copies
+def discard_asset(filename):
+    manifest.load()
+    entry = manifest.discard(filename)
+    if entry is not None:
+        remove_built(entry)
+        manifest.save()
+
+
+# Template helper used instead of url_for('static'): links the fingerprinted
+# copy when there is one, building it on first use for new uploads
+def asset_url(filename):
+    from services.uploads import remote_upload_url
+
+    # Uploads kept in remote storage are fetched from there
+    url = remote_upload_url(filename)
+    if url is not None:
+        return url
+    if not current_app.config.get('ASSET_FINGERPRINTING', True) or not is_asset(filename):
+        return url_for('static', filename=filename)
+
+    manifest.load()
+    entry = manifest.get(filename)
+    if entry is None or current_app.debug:
+        try:
+            stat = os.stat(static_path(filename))
+        except OSError:
+            return url_for('static', filename=filename)
+        if not is_current(entry, stat):
+            entry = build_asset(filename)
+            manifest.save()
+    return url_for('static', filename=entry['file'])
+
+
+# Static view: fingerprinted files never change, so they are cached for a year
+# and served precompressed when the client accepts it
+def send_static(filename):
+    if not filename.startswith(BUILD_DIR + '/'):
+        return current_app.send_static_file(filename)
+
+    accepted = request.accept_encodings
+    for encoding, suffix in ENCODINGS:
+        if accepted[encoding] and os.path.isfile(static_path(filename + suffix)):
+            response = send_from_directory(current_app.static_folder, filename + suffix, max_age=FAR_FUTURE)
+            response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(current_app.static_folder, filename, max_age=FAR_FUTURE)
+
+    if os.path.splitext(filename)[1].lower() in COMPRESSIBLE:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,57 @@
+import gzip
+
+import brotli
+from flask import current_app, request
+
+# Content-Encodings offered, in order of preference
+ENCODINGS = ('br', 'gzip')
+
+
+def compress(data, encoding):
+    config = current_app.config
+    if encoding == 'br':
+        return brotli.compress(data, quality=config.get('COMPRESSION_BROTLI_LEVEL', 5))
+    return gzip.compress(data, compresslevel=config.get('COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+
+
+def negotiate():
+    accepted = request.accept_encodings
+    for encoding in ENCODINGS:
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+# Compress dynamic text responses for clients that accept it. Files sent from
+# disk (static files, downloads) are left alone; precompressed assets already
+# carry their Content-Encoding. Pages from the page cache bring a dict of
+# encoded bodies, so each page is compressed once per encoding.
+def compress_response(response):
+    config = current_app.config
+    if (not config.get('COMPRESSION_ENABLED', True)
+            or response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config.get('COMPRESSION_MIMETYPES', ())):
+        return response
+
+    # The body differs by Accept-Encoding even when this client gets it uncompressed
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate()
+    if encoding is None or len(response.get_data()) < config.get('COMPRESSION_MIN_SIZE', 500):
+        return response
+
+    encoded = getattr(response, 'encoded_bodies', None)
+    body = encoded.get(encoding) if encoded is not None else None
+    if body is None:
+        body = compress(response.get_data(), encoding)
+        if encoded is not None:
+            encoded[encoding] = body
+    response.set_data(body)
+    response.content_encoding = encoding
+    # The compressed bytes differ from the ones the validator was made for
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,98 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from extensions import content_changed
+from models.models import SiteImage, ContactInfo, Education, Experience, ImageDerivative, Resume
+
+# Contact details shown until the admin saves their own
+DEFAULT_CONTACT_INFO = {
+    'email': 'chidanandkhot2@gmail.com',
+    'phone': '',
+    'location': 'City, Country',
+    'map_embed_url': 'https://www.google.com/maps/embed?pb=!1m18!1m12!1m3!1d3001156.428151844!2d-78.01059036852154!3d42.72837739473232!2m3!1f0!2f0!3f0!3m2!1i1024!2i768!4f13.1!3m3!1m2!1s0x4ccc4bf0f123a5a9%3A0xddcfc6c1de189567!2sNew%20York%2C%20USA!5e0!3m2!1sen!2sus!4v1690923407186!5m2!1sen!2sus'
+}
+
+# Tables whose rows make up the snapshot
+SNAPSHOT_TABLES = frozenset(model.__tablename__ for model in (SiteImage, ContactInfo, Education, Experience, ImageDerivative, Resume))
+
+# Immutable, read-only view of the site-wide content shared by all requests
+ContentSnapshot = namedtuple('ContentSnapshot', ['version', 'site_images', 'contact_info', 'education_items', 'experience_items', 'image_derivatives', 'resume'])
+
+_row_types = {}
+
+
+# Copy a model instance into a plain namedtuple so it can be shared across threads
+def freeze(obj):
+    columns = [column.key for column in obj.__table__.columns]
+    row_type = _row_types.get(type(obj))
+    if row_type is None:
+        row_type = _row_types.setdefault(type(obj), namedtuple(type(obj).__name__ + 'Row', columns))
+    return row_type(*(getattr(obj, name) for name in columns))
+
+
+def load_snapshot(version):
+    site_images = {img.name: freeze(img) for img in SiteImage.query.all()}
+
+    contact_info = ContactInfo.query.first()
+    if contact_info:
+        contact_info = freeze(contact_info)
+    else:
+        contact_info = freeze(ContactInfo(id=None, **DEFAULT_CONTACT_INFO))
+
+    education_items = tuple(freeze(item) for item in Education.query.order_by(Education.order).all())
+    experience_items = tuple(freeze(item) for item in Experience.query.order_by(Experience.order).all())
+
+    image_derivatives = {}
+    for derivative in ImageDerivative.query.order_by(ImageDerivative.width).all():
+        image_derivatives.setdefault(derivative.source, []).append(freeze(derivative))
+
+    resume = Resume.query.first()
+    if resume:
+        resume = freeze(resume)
+
+    return ContentSnapshot(
+        version=version,
+        site_images=MappingProxyType(site_images),
+        contact_info=contact_info,
+        education_items=education_items,
+        experience_items=experience_items,
+        image_derivatives=MappingProxyType({source: tuple(rows) for source, rows in image_derivatives.items()}),
+        resume=resume
+    )
+
+
+# Holds the current snapshot and rebuilds it on first read after a content commit
+class ContentStore:
+    def __init__(self):
+        self._snapshot = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != self._version:
+                snapshot = load_snapshot(self._version)
+                self._snapshot = snapshot
+            return snapshot
+
+
+content_store = ContentStore()
+
+
+@content_changed.connect
+def refresh_snapshot(sender, tables=frozenset(), **extra):
+    if tables & SNAPSHOT_TABLES:
+        content_store.invalidate()
+
+
+def get_snapshot():
+    return content_store.get()
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, request, session
+from sqlalchemy import select
+
+from extensions import db, content_changed
+from models.models import ContentVersion
+from services.page_cache import login_state
+
+# Templates and code can change on deploy, so nothing is older than the process itself
+STARTED_AT = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+# In-process copy of the content_versions watermarks
+class ContentVersions:
+    def __init__(self):
+        self._versions = {}  # table name -> (version, updated_at)
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def update(self, versions):
+        with self._lock:
+            for table_name, (version, updated_at) in versions.items():
+                known = self._versions.get(table_name)
+                if known is None or known[0] < version:
+                    self._versions[table_name] = (version, updated_at)
+
+    # Re-read the watermarks so commits made by other processes are noticed
+    def poll(self):
+        interval = current_app.config.get('CONTENT_VERSION_POLL_INTERVAL', 2)
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < interval:
+                return
+            first_load = self._checked_at is None
+            self._checked_at = now
+
+        rows = db.session.execute(
+            select(ContentVersion.table_name, ContentVersion.version, ContentVersion.updated_at)
+        ).all()
+        fresh = {table_name: (version, updated_at) for table_name, version, updated_at in rows}
+        changed = frozenset(
+            table_name for table_name, (version, _) in fresh.items()
+            if self._versions.get(table_name, (0, None))[0] < version
+        )
+        self.update(fresh)
+        if changed and not first_load:
+            content_changed.send(self, tables=changed, versions=fresh)
+
+    def watermark(self, tables):
+        self.poll()
+        versions = tuple(self._versions.get(table_name, (0, None)) for table_name in tables)
+        last_modified = STARTED_AT
+        for _, updated_at in versions:
+            if updated_at is not None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc, microsecond=0)
+                last_modified = max(last_modified, updated_at)
+        return tuple(version for version, _ in versions), last_modified
+
+
+content_versions = ContentVersions()
+
+
+@content_changed.connect
+def record_versions(sender, versions=None, **extra):
+    if versions:
+        content_versions.update(versions)
+
+
+# Emit strong ETag / Last-Modified headers for a public page and answer
+# conditional GETs with a 304 before the view runs any query or template
+def conditional_page(*models):
+    tables = tuple(model.__tablename__ for model in models)
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Pending flash messages are rendered into the page, so it can't be revalidated
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            versions, last_modified = content_versions.watermark(tables)
+            state = login_state()
+            key = f"{request.full_path}|{state}|{versions}|{STARTED_AT.timestamp()}"
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+            if request.if_none_match:
+                # Compressed responses carry the ETag as a weak one
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since:
+                not_modified = request.if_modified_since >= last_modified
+            else:
+                not_modified = False
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,153 @@
+import json
+import os
+import re
+import threading
+
+from flask import current_app, request
+from markupsafe import Markup
+
+from services.assets import BUILD_DIR, static_path
+from services.jobs import get_executor
+from services.page_cache import page_cache
+from services.vendor import BUNDLE_CSS, drop_unused_at_rules, purge_rules, vendor_bundle
+
+# Public endpoints that get inlined critical CSS -> their page template
+CRITICAL_PAGES = {
+    'main.home': 'home.html',
+    'main.about': 'about.html',
+    'main.projects': 'projects.html',
+    'main.skills': 'skills.html',
+    'main.certificates': 'certificates.html',
+    'main.contact': 'contact.html',
+}
+
+# Set on the internal request that renders a page to analyse it
+GENERATING = 'critical_css.generating'
+
+
+# Stylesheets loaded by base.html that we can inline from; the CDN fallback can't be
+def stylesheets():
+    return ([BUNDLE_CSS] if vendor_bundle() else []) + ['css/style.css']
+
+
+# Fingerprint of everything the critical CSS of a page depends on
+def signature(endpoint):
+    paths = [static_path(filename) for filename in stylesheets()]
+    paths += [os.path.join(current_app.root_path, 'templates', name) for name in ('base.html', CRITICAL_PAGES[endpoint])]
+    parts = []
+    for path in paths:
+        stat = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size}")
+    return '|'.join(parts)
+
+
+# Markup near the top of the body, without scripts and inline styles
+def above_the_fold(html):
+    body = html.split('<body', 1)[-1]
+    body = re.sub(r'<(script|style)\b.*?</\1>', '', body, flags=re.S | re.I)
+    return body[:current_app.config.get('CRITICAL_CSS_FOLD_BYTES', 8000)]
+
+
+# The rules of our stylesheets that apply to the classes and ids above the fold
+def extract_critical_css(html):
+    tokens = set()
+    for value in re.findall(r'\b(?:class|id)="([^"]*)"', above_the_fold(html)):
+        tokens.update(value.split())
+
+    parts = []
+    for filename in stylesheets():
+        with open(static_path(filename), encoding='utf-8') as f:
+            css = re.sub(r'/\*.*?\*/', '', f.read(), flags=re.S)
+        parts.append(drop_unused_at_rules(purge_rules(css, tokens), ''))
+    return re.sub(r'\s+', ' ', ''.join(parts)).strip()
+
+
+# endpoint -> (signature, css), mirrored to static/dist/critical/ for other processes
+class CriticalCSS:
+    def __init__(self):
+        self._entries = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def path(self, endpoint):
+        return static_path(f"{BUILD_DIR}/critical/{endpoint}.json")
+
+    def get(self, endpoint):
+        entry = self._entries.get(endpoint)
+        if entry is None:
+            try:
+                with open(self.path(endpoint)) as f:
+                    entry = tuple(json.load(f))
+            except (OSError, ValueError):
+                return None
+            self._entries[endpoint] = entry
+        return entry
+
+    def set(self, endpoint, sig, css):
+        path = self.path(endpoint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump([sig, css], f)
+        os.replace(temp_path, path)
+        self._entries[endpoint] = (sig, css)
+
+    def schedule(self, app, endpoint):
+        with self._lock:
+            if endpoint in self._pending:
+                return
+            self._pending.add(endpoint)
+        get_executor(app).submit(self.regenerate, app, endpoint)
+
+    # Regenerations pending in a parent process never finish in a forked worker
+    def forget_pending(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    # Render the page as an anonymous visitor and keep the rules it needs above the fold
+    def regenerate(self, app, endpoint):
+        try:
+            with app.test_request_context():
+                sig = signature(endpoint)
+                url = app.url_for(endpoint)
+            response = app.test_client().get(url, environ_overrides={GENERATING: True})
+            if response.status_code != 200:
+                app.logger.warning(f"Critical CSS for {endpoint} skipped: {url} returned {response.status_code}")
+                return None
+            with app.app_context():
+                css = extract_critical_css(response.get_data(as_text=True))
+                self.set(endpoint, sig, css)
+            # Cached pages were rendered with the old CSS, or none
+            page_cache.clear()
+            return css
+        except Exception:
+            app.logger.exception(f"Critical CSS for {endpoint} failed")
+            return None
+        finally:
+            with self._lock:
+                self._pending.discard(endpoint)
+
+
+critical_store = CriticalCSS()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=critical_store.forget_pending)
+
+
+# Template helper: the critical CSS of the current page, or None while it is
+# missing or out of date (regeneration is then started in the background)
+def critical_css():
+    endpoint = request.endpoint
+    if (not current_app.config.get('CRITICAL_CSS_ENABLED', True)
+            or endpoint not in CRITICAL_PAGES or request.environ.get(GENERATING)):
+        return None
+
+    entry = critical_store.get(endpoint)
+    if entry is not None and entry[0] == signature(endpoint):
+        return Markup(entry[1])
+    critical_store.schedule(current_app._get_current_object(), endpoint)
+    return None
+
+
+def build_critical_css(app):
+    return {endpoint: critical_store.regenerate(app, endpoint) for endpoint in CRITICAL_PAGES}
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+
+# PRAGMAs applied to every new SQLite connection, per APP_ENV profile
+SQLITE_PRAGMAS = {
+    'development': {
+        'busy_timeout': 5000,  # Wait for the write lock instead of failing with "database is locked"
+    },
+    'production': {
+        'journal_mode': 'WAL',  # Readers no longer block behind the writer
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',  # Durable with WAL; fsync only at checkpoints
+        'cache_size': -32000,  # 32 MB page cache per connection
+        'mmap_size': 268435456,  # Memory-map up to 256 MB of the database file
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def is_sqlite_memory(uri):
+    return uri.startswith('sqlite') and (uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri)
+
+
+# Engine options from the app config; in-memory SQLite uses a single static connection
+def engine_options(config):
+    if is_sqlite_memory(config['SQLALCHEMY_DATABASE_URI']):
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+    }
+
+
+# The SQLite PRAGMAs for an APP_ENV profile
+def sqlite_pragmas(app_env):
+    if app_env not in SQLITE_PRAGMAS:
+        raise RuntimeError(f"Unknown APP_ENV {app_env!r}: use one of {', '.join(SQLITE_PRAGMAS)} "
+                           f"or set SQLITE_PRAGMAS")
+    return SQLITE_PRAGMAS[app_env]
+
+
+def configure_sqlite(engine, pragmas):
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+# Run mixed public reads and admin-style writes against the configured database
+# from several threads and count the operations that failed
+def stress_test(app, seconds=10, readers=8, writers=2):
+    from models.models import Project, Skill, SiteImage, Education, Message, ContentVersion
+
+    deadline = time.monotonic() + seconds
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    errors = []
+    lock = threading.Lock()
+
+    def record(kind, error=None):
+        with lock:
+            counts[kind] += 1
+            if error is not None:
+                counts['errors'] += 1
+                errors.append(str(error).splitlines()[0])
+
+    def reader():
+        with app.app_context():
+            while time.monotonic() < deadline:
+                try:
+                    Project.query.all()
+                    Skill.query.all()
+                    SiteImage.query.all()
+                    Education.query.order_by(Education.order).all()
+                    ContentVersion.query.all()
+                    record('reads')
+                except OperationalError as e:
+                    db.session.rollback()
+                    record('reads', e)
+
+    def writer():
+        with app.app_context():
+            while time.monotonic() < deadline:
+                try:
+                    message = Message(name='stress test', email='stress@example.com', message='stress test')
+                    db.session.add(message)
+                    db.session.commit()
+                    db.session.delete(message)
+                    db.session.commit()
+                    record('writes')
+                except OperationalError as e:
+                    db.session.rollback()
+                    record('writes', e)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts, errors
@@ -0,0 +1,79 @@
+import mimetypes
+import os
+import threading
+
+from flask import current_app, redirect, request, send_file
+from werkzeug.exceptions import NotFound
+
+from services.assets import file_hash, static_path
+from services.storage import get_storage
+from services.uploads import storage_key
+
+# Ways of handing the transfer to the front proxy, by FILE_OFFLOAD value
+OFFLOAD_HEADERS = {
+    'x-sendfile': 'X-Sendfile',  # Apache mod_xsendfile, lighttpd
+    'x-accel-redirect': 'X-Accel-Redirect',  # nginx internal location
+}
+
+_etags = {}  # path -> (mtime, size, etag)
+_etags_lock = threading.Lock()
+
+
+# Strong ETag from the file contents, hashed once per version of the file
+def file_etag(path, stat):
+    with _etags_lock:
+        cached = _etags.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    etag = file_hash(path)
+    with _etags_lock:
+        _etags[path] = (stat.st_mtime_ns, stat.st_size, etag)
+    return etag
+
+
+# Send a file under static/ as a download. Range requests, If-None-Match and
+# If-Range are answered here; with FILE_OFFLOAD set only the headers are
+# produced and the proxy streams the bytes. Files in remote storage are
+# fetched by the client from there through a short-lived presigned URL.
+def send_download(filename, download_name):
+    storage = get_storage()
+    if not storage.local:
+        key = storage_key(filename)
+        if storage.stat(key) is None:
+            raise NotFound()
+        response = redirect(storage.url(key, download_name=download_name,
+                                        expires=current_app.config.get('STORAGE_DOWNLOAD_EXPIRES', 300)))
+        response.cache_control.no_store = True
+        return response
+
+    path = static_path(filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise NotFound()
+    etag = file_etag(path, stat)
+
+    offload = current_app.config.get('FILE_OFFLOAD')
+    if offload not in OFFLOAD_HEADERS:
+        response = send_file(path, as_attachment=True, download_name=download_name,
+                             etag=etag, conditional=True, max_age=None)
+    else:
+        mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response.make_conditional(request)
+        if response.status_code == 200:
+            if offload == 'x-accel-redirect':
+                target = current_app.config.get('FILE_OFFLOAD_PREFIX', '/protected/') + filename
+            else:
+                target = path
+            response.headers[OFFLOAD_HEADERS[offload]] = target
+
+    # Advertise ranges up front so PDF viewers and download managers use them
+    response.accept_ranges = 'bytes'
+    # A new upload changes what the URL serves, so clients revalidate with the ETag
+    response.cache_control.no_cache = True
+    return response
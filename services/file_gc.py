@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from extensions import db
+from models.models import Blob, ImageDerivative, Job
+from services.assets import discard_asset, manifest, static_path
+from services.images import delete_derivatives
+from services.jobs import enqueue, job_handler
+from services.storage import get_storage
+from services.uploads import BLOB_DIR, UPLOAD_FIELDS, UPLOAD_FILE, blob_digest, blob_key, release_blob
+
+# Directories under static/ holding uploads and their variants
+UPLOAD_ROOTS = ('images', 'files')
+
+# Orphans found by a collection; sizes in bytes
+GCReport = namedtuple('GCReport', ['orphans', 'reclaimable', 'recent', 'deleted', 'stale_sources'])
+
+_collector = None
+
+
+def walk(directory):
+    root = static_path(directory)
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            relative = os.path.relpath(os.path.join(dirpath, name), current_app.static_folder)
+            yield relative.replace(os.sep, '/'), name
+
+
+# Every file under static/ a database row still points at, and the image
+# sources whose variants belong to rows that no longer exist
+def referenced_files():
+    referenced = set()
+    for model, (field, directory) in UPLOAD_FIELDS.items():
+        for (filename,) in db.session.query(getattr(model, field)).filter(getattr(model, field).isnot(None)):
+            referenced.add(f"{directory}/{filename}")
+
+    stale_sources = set()
+    for source, filename in db.session.query(ImageDerivative.source, ImageDerivative.filename):
+        if source in referenced:
+            referenced.add(filename)
+        else:
+            stale_sources.add(source)
+    return referenced, stale_sources
+
+
+# The asset pipeline hard-links uploads into static/dist; those links go with the file
+def fingerprinted_links(path, inode):
+    manifest.load()
+    entry = manifest.get(path)
+    if entry is None:
+        return 0
+    try:
+        stat = os.stat(static_path(entry['file']))
+    except OSError:
+        return 0
+    return 1 if (stat.st_dev, stat.st_ino) == inode else 0
+
+
+# Diff static/images, static/files and the blob store against the filename
+# columns, and with remote storage, collect the blobs whose refcount is zero.
+# Files touched within the grace period are left alone, since an upload is
+# stored a moment before its row is committed.
+def collect_garbage(delete=False, grace_period=None):
+    if grace_period is None:
+        grace_period = current_app.config.get('GC_GRACE_PERIOD', 86400)
+    cutoff = time.time() - grace_period
+    referenced, stale_sources = referenced_files()
+    live_blobs = {digest for (digest,) in db.session.query(Blob.digest).filter(Blob.refcount > 0)}
+
+    # Only files named by the upload code are ever collected
+    candidates = []
+    for directory in UPLOAD_ROOTS:
+        for path, name in walk(directory):
+            if UPLOAD_FILE.fullmatch(name) and path not in referenced:
+                candidates.append(path)
+    for path, name in walk(BLOB_DIR):
+        # Leftovers of interrupted uploads end in .upload
+        if blob_digest(name) not in live_blobs or name.endswith('.upload'):
+            candidates.append(path)
+
+    orphans = []
+    recent = 0
+    links = {}  # inode -> (orphaned links, total links, size)
+    for path in candidates:
+        stat = os.stat(static_path(path))
+        # Linking a blob into place updates its ctime, not its mtime
+        if max(stat.st_mtime, stat.st_ctime) > cutoff:
+            recent += 1
+            continue
+        orphans.append((path, stat.st_size))
+        inode = (stat.st_dev, stat.st_ino)
+        count, nlink, size = links.get(inode, (0, stat.st_nlink, stat.st_size))
+        links[inode] = (count + 1 + fingerprinted_links(path, inode), nlink, size)
+    # Hard-linked bytes only come back once every link is gone
+    reclaimable = sum(size for count, nlink, size in links.values() if count >= nlink)
+
+    # Blobs in remote storage have no file here; their rows tell which are unused
+    remote_orphans = []
+    if not get_storage().local:
+        since = datetime.utcnow() - timedelta(seconds=grace_period)
+        for blob in Blob.query.filter(Blob.refcount <= 0).all():
+            if blob.created_at > since:
+                recent += 1
+                continue
+            remote_orphans.append((blob.digest, blob_key(blob.digest, blob.extension), blob.size))
+            reclaimable += blob.size
+
+    deleted = 0
+    if delete:
+        for path, _ in orphans:
+            try:
+                os.remove(static_path(path))
+            except FileNotFoundError:
+                continue
+            deleted += 1
+            if path.startswith(BLOB_DIR + '/'):
+                digest = blob_digest(path.rsplit('/', 1)[-1])
+                if digest:
+                    Blob.query.filter(Blob.digest == digest, Blob.refcount <= 0).delete()
+            else:
+                discard_asset(path)
+        for digest, _, _ in remote_orphans:
+            if release_blob(digest):
+                deleted += 1
+        for source in stale_sources:
+            delete_derivatives(source)
+        db.session.commit()
+
+    orphans += [(key, size) for _, key, size in remote_orphans]
+    return GCReport(orphans=orphans, reclaimable=reclaimable, recent=recent,
+                    deleted=deleted, stale_sources=sorted(stale_sources))
+
+
+@job_handler('collect_garbage')
+def collect_garbage_job():
+    report = collect_garbage(delete=True)
+    current_app.logger.info(f"Removed {report.deleted} orphaned files, {report.reclaimable} bytes")
+
+
+# Queues a collection job every GC_INTERVAL seconds, unless another process
+# already queued one within the interval
+class GarbageCollector(threading.Thread):
+    def __init__(self, app):
+        super().__init__(name='file-gc', daemon=True)
+        self.app = app
+
+    def run(self):
+        interval = self.app.config.get('GC_INTERVAL')
+        while True:
+            with self.app.app_context():
+                try:
+                    since = datetime.utcnow() - timedelta(seconds=interval)
+                    if not Job.query.filter(Job.kind == 'collect_garbage', Job.created_at > since).first():
+                        enqueue('collect_garbage')
+                        db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Scheduling file garbage collection failed")
+            time.sleep(interval)
+
+
+def start_garbage_collector(app):
+    global _collector
+    if _collector is None and app.config.get('GC_INTERVAL'):
+        _collector = GarbageCollector(app)
+        _collector.start()
+    return _collector
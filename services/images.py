@@ -0,0 +1,161 @@
+import io
+import os
+
+from flask import current_app
+from markupsafe import Markup, escape
+from PIL import Image, ImageOps, features
+
+from extensions import db
+from models.models import Project, Skill, Certificate, Education, SiteImage, ImageDerivative
+from services.assets import asset_url, discard_asset
+from services.content_snapshot import get_snapshot
+from services.jobs import job_handler
+from services.storage import get_storage
+from services.uploads import blob_digest, storage_key
+
+# Pillow format names and MIME types for the encodings we can produce
+FORMATS = {
+    'avif': ('AVIF', 'image/avif'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+}
+
+# Extensions of uploads that get a resized copy in their own format
+FALLBACK_FORMATS = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png'}
+
+
+# Encode an image and write it to storage under filename
+def encode(image, filename, fmt):
+    pillow_format, mime = FORMATS[fmt]
+    quality = current_app.config.get('IMAGE_VARIANT_QUALITY', 80)
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        image.convert('RGB').save(buffer, pillow_format, quality=quality, optimize=True, progressive=True)
+    elif fmt == 'png':
+        image.save(buffer, pillow_format, optimize=True)
+    else:
+        image.save(buffer, pillow_format, quality=quality)
+    buffer.seek(0)
+    get_storage().put(storage_key(filename), buffer, content_type=mime)
+
+
+# Resize an uploaded image into several widths and modern encodings, and record
+# the results in image_derivatives. The caller commits the session.
+def generate_derivatives(source):
+    stem, ext = os.path.splitext(source)
+    fallback = FALLBACK_FORMATS.get(ext.lower())
+    if fallback is None:
+        # GIFs may be animated; serve them untouched
+        return []
+
+    formats = [fmt for fmt in current_app.config.get('IMAGE_VARIANT_FORMATS', ('avif', 'webp'))
+               if fmt in FORMATS and features.check(fmt)]
+    formats.append(fallback)
+    widths = current_app.config.get('IMAGE_VARIANT_WIDTHS', (320, 640, 960, 1280))
+
+    delete_derivatives(source)
+    try:
+        with get_storage().get(storage_key(source)) as f, Image.open(f) as original:
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    except (OSError, ValueError) as e:
+        current_app.logger.warning(f"Could not process image {source}: {e}")
+        return []
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    # Every width smaller than the original, plus the original width re-encoded
+    targets = sorted({width for width in widths if width < original.width} | {original.width})
+
+    # The upload itself is recorded as the full-size fallback
+    derivatives = [ImageDerivative(source=source, filename=source, format=fallback,
+                                   width=original.width, height=original.height)]
+    for width in targets:
+        height = max(1, round(original.height * width / original.width))
+        resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            if fmt == fallback and width == original.width:
+                continue
+            filename = f"{stem}-{width}w.{fmt}"
+            encode(resized, filename, fmt)
+            derivatives.append(ImageDerivative(source=source, filename=filename, format=fmt, width=width, height=height))
+    db.session.add_all(derivatives)
+    return derivatives
+
+
+# Background job queued by the upload routes; pages show the original until it finishes
+@job_handler('image_derivatives')
+def process_image(source):
+    # Content-addressed uploads never change, so variants made for an earlier
+    # upload of the same file are still good. Of two jobs racing for one
+    # source, the second to commit fails on the unique filename and its retry
+    # returns here.
+    if blob_digest(source.rsplit('/', 1)[-1]) and ImageDerivative.query.filter_by(source=source).first():
+        return
+    generate_derivatives(source)
+
+
+# Remove the resized copies of an image from storage and from image_derivatives
+def delete_derivatives(source):
+    for derivative in ImageDerivative.query.filter_by(source=source).all():
+        if derivative.filename != source:
+            get_storage().delete(storage_key(derivative.filename))
+            discard_asset(derivative.filename)
+        db.session.delete(derivative)
+
+
+# Every uploaded image referenced by the models, relative to static/
+def uploaded_images():
+    for project in Project.query.all():
+        yield 'images/projects/' + project.image
+    for skill in Skill.query.filter(Skill.image.isnot(None)).all():
+        yield 'images/skills/' + skill.image
+    for certificate in Certificate.query.all():
+        yield 'images/certificates/' + certificate.image
+    for education in Education.query.filter(Education.image.isnot(None)).all():
+        yield 'images/education/' + education.image
+    for site_image in SiteImage.query.all():
+        yield 'images/' + site_image.filename
+
+
+# Generate variants for images uploaded before the pipeline existed
+def backfill_derivatives():
+    done = {source for (source,) in db.session.query(ImageDerivative.source).distinct()}
+    count = 0
+    for source in set(uploaded_images()) - done:
+        if get_storage().stat(storage_key(source)) is not None and generate_derivatives(source):
+            count += 1
+    db.session.commit()
+    return count
+
+
+def srcset(derivatives):
+    return ', '.join(f"{asset_url(d.filename)} {d.width}w" for d in derivatives)
+
+
+# Template helper emitting <picture> markup with AVIF/WebP sources and a
+# resized srcset for the original format, or a plain <img> if none exist yet
+def responsive_image(source, alt='', sizes='100vw', **attrs):
+    derivatives = get_snapshot().image_derivatives.get(source, ())
+    attrs.setdefault('loading', 'lazy')
+    extra = ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items())
+    src = asset_url(source)
+    if not derivatives:
+        return Markup(f'<img src="{src}" alt="{escape(alt)}"{extra}>')
+
+    by_format = {}
+    for derivative in sorted(derivatives, key=lambda d: d.width):
+        by_format.setdefault(derivative.format, []).append(derivative)
+
+    parts = ['<picture>']
+    for fmt in ('avif', 'webp'):
+        if fmt in by_format:
+            _, mime = FORMATS[fmt]
+            parts.append(f'<source type="{mime}" srcset="{srcset(by_format[fmt])}" sizes="{escape(sizes)}">')
+
+    fallback = srcset([d for d in sorted(derivatives, key=lambda d: d.width) if d.format not in ('avif', 'webp')])
+    parts.append(f'<img src="{src}" srcset="{fallback}" sizes="{escape(sizes)}" alt="{escape(alt)}"{extra}>')
+    parts.append('</picture>')
+    return Markup(''.join(parts))
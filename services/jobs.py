@@ -0,0 +1,129 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.models import Job
+from services.process_local import ProcessLocal
+
+# Job kind -> function called with the job's payload as keyword arguments
+handlers = {}
+
+_executor = ProcessLocal()
+
+
+def job_handler(kind):
+    def decorator(f):
+        handlers[kind] = f
+        return f
+    return decorator
+
+
+def get_executor(app):
+    return _executor.get(lambda: ThreadPoolExecutor(max_workers=app.config.get('JOB_WORKERS', 2),
+                                                    thread_name_prefix='job-worker'))
+
+
+# Record a job in the current transaction; it is handed to the worker pool once
+# the transaction commits, so a rolled back request never runs its jobs
+def enqueue(kind, **payload):
+    job = Job(kind=kind, payload=json.dumps(payload, sort_keys=True), status='pending')
+    db.session.add(job)
+    db.session.flush()
+    db.session.info.setdefault('enqueued_jobs', []).append((current_app._get_current_object(), job.id))
+    return job
+
+
+# Like enqueue, but reuses an identical job that is still pending or running,
+# for jobs whose result depends only on their payload
+def enqueue_once(kind, **payload):
+    job = Job.query.filter(Job.kind == kind, Job.payload == json.dumps(payload, sort_keys=True),
+                           Job.status.in_(('pending', 'running'))).first()
+    return job or enqueue(kind, **payload)
+
+
+@event.listens_for(Session, 'after_commit')
+def submit_enqueued_jobs(session):
+    for app, job_id in session.info.pop('enqueued_jobs', []):
+        get_executor(app).submit(run_job, app, job_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_enqueued_jobs(session):
+    session.info.pop('enqueued_jobs', None)
+
+
+def run_job(app, job_id):
+    with app.app_context():
+        # Claim the job atomically so two workers never run it twice
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == 'pending')
+            .values(status='running', attempts=Job.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return
+        job = db.session.get(Job, job_id)
+
+        # The handler's changes are committed with the job's status, so a
+        # commit that fails (a constraint, say) counts as a failed attempt
+        try:
+            handlers[job.kind](**json.loads(job.payload))
+            job.status = 'done'
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception(f"Job {job_id} ({job.kind}) failed")
+            max_attempts = app.config.get('JOB_MAX_ATTEMPTS', 3)
+            job.status = 'pending' if job.attempts < max_attempts else 'failed'
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+        if job.status == 'pending':
+            retry_later(app, job_id, job.attempts)
+
+
+# Resubmit a failed job after a delay doubling with each attempt, so a
+# transient error (a locked database, say) doesn't use up every attempt at once
+def retry_later(app, job_id, attempts):
+    delay = app.config.get('JOB_RETRY_DELAY', 5) * 2 ** (attempts - 1)
+    timer = threading.Timer(min(delay, 3600), lambda: get_executor(app).submit(run_job, app, job_id))
+    timer.daemon = True
+    timer.start()
+
+
+# Put jobs that were running when the server last stopped back in the queue.
+# Like release_claims, only safe while no worker is running jobs.
+def release_running_jobs():
+    db.session.execute(update(Job).where(Job.status == 'running').values(status='pending'))
+    db.session.commit()
+
+
+# Submit the queued jobs to this process's pool; a job claimed by another
+# process in the meantime is skipped by run_job
+def resume_jobs(app):
+    with app.app_context():
+        job_ids = [job_id for (job_id,) in db.session.query(Job.id).filter_by(status='pending')]
+    for job_id in job_ids:
+        get_executor(app).submit(run_job, app, job_id)
+    return len(job_ids)
+
+
+def job_status():
+    active = Job.query.filter(Job.status.in_(('pending', 'running'))).order_by(Job.created_at).all()
+    since = datetime.utcnow() - timedelta(days=1)
+    failed = (Job.query.filter(Job.status == 'failed', Job.finished_at >= since)
+              .order_by(Job.finished_at.desc()).limit(5).all())
+    return {
+        'active': [{'id': job.id, 'kind': job.kind, 'status': job.status} for job in active],
+        'failed': [{'id': job.id, 'kind': job.kind, 'error': job.error} for job in failed],
+    }
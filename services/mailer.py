@@ -0,0 +1,139 @@
+import smtplib
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Message as MailMessage
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.models import OutboxMessage
+
+_dispatcher = None
+
+
+# Write an email to the outbox in the current transaction; the dispatcher sends
+# it once the transaction commits
+def queue_mail(subject, recipients, body, message=None):
+    item = OutboxMessage(subject=subject, recipients=','.join(recipients), body=body, message=message)
+    db.session.add(item)
+    db.session.info['outbox_queued'] = True
+    return item
+
+
+@event.listens_for(Session, 'after_commit')
+def wake_dispatcher(session):
+    if session.info.pop('outbox_queued', False) and _dispatcher is not None:
+        _dispatcher.wakeup.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_outbox_wakeup(session):
+    session.info.pop('outbox_queued', None)
+
+
+def retry_later(item, error):
+    config = current_app.config
+    item.attempts += 1
+    item.last_error = str(error)
+    if item.attempts >= config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 6):
+        item.status = 'dead'
+        current_app.logger.warning(f"Giving up on outbox message {item.id} after {item.attempts} attempts: {error}")
+    else:
+        item.status = 'pending'
+        delay = config.get('MAIL_OUTBOX_RETRY_DELAY', 30) * 2 ** (item.attempts - 1)
+        item.next_attempt_at = datetime.utcnow() + timedelta(seconds=min(delay, 3600))
+
+
+# Mark the next due messages as 'sending' so no other process picks them up
+def claim_batch():
+    batch_size = current_app.config.get('MAIL_OUTBOX_BATCH_SIZE', 20)
+    due = (db.session.query(OutboxMessage.id)
+           .filter(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= datetime.utcnow())
+           .order_by(OutboxMessage.id)
+           .limit(batch_size))
+    claimed = []
+    for (item_id,) in due.all():
+        result = db.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id == item_id, OutboxMessage.status == 'pending')
+            .values(status='sending')
+        )
+        if result.rowcount:
+            claimed.append(item_id)
+    db.session.commit()
+    if not claimed:
+        return []
+    return OutboxMessage.query.filter(OutboxMessage.id.in_(claimed)).order_by(OutboxMessage.id).all()
+
+
+# Send every due outbox message in batches over a single SMTP connection
+def drain_outbox():
+    batch = claim_batch()
+    if not batch:
+        return 0
+
+    sent = 0
+    mail = current_app.extensions['mail']
+    try:
+        with mail.connect() as connection:
+            while batch:
+                for item in batch:
+                    try:
+                        connection.send(MailMessage(subject=item.subject,
+                                                    recipients=item.recipients.split(','),
+                                                    body=item.body))
+                    except smtplib.SMTPServerDisconnected:
+                        raise
+                    except smtplib.SMTPException as e:
+                        # Rejected by the relay (bad recipient etc.); the connection is still usable
+                        retry_later(item, e)
+                    else:
+                        item.status = 'sent'
+                        item.sent_at = datetime.utcnow()
+                        sent += 1
+                db.session.commit()
+                batch = claim_batch()
+    except (OSError, smtplib.SMTPException) as e:
+        # Could not connect, or the connection dropped: back off the rest of the batch
+        for item in batch:
+            if item.status == 'sending':
+                retry_later(item, e)
+        db.session.commit()
+    return sent
+
+
+# Put messages back in the queue if a dispatcher died while sending them. Any
+# 'sending' row is taken to be abandoned, so this must only run while no
+# dispatcher is alive: once at startup, before server workers are forked.
+def release_claims():
+    db.session.execute(update(OutboxMessage).where(OutboxMessage.status == 'sending').values(status='pending'))
+    db.session.commit()
+
+
+class OutboxDispatcher(threading.Thread):
+    def __init__(self, app):
+        super().__init__(name='outbox-dispatcher', daemon=True)
+        self.app = app
+        self.wakeup = threading.Event()
+
+    def run(self):
+        interval = self.app.config.get('MAIL_OUTBOX_POLL_INTERVAL', 30)
+        while True:
+            with self.app.app_context():
+                try:
+                    drain_outbox()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Outbox dispatch failed")
+            self.wakeup.wait(interval)
+            self.wakeup.clear()
+
+
+def start_dispatcher(app):
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = OutboxDispatcher(app)
+        _dispatcher.start()
+    return _dispatcher
@@ -0,0 +1,79 @@
+import importlib
+import os
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+# Migration modules live in the migrations/ package as NNNN_description.py,
+# each with an upgrade(connection) function
+MIGRATIONS_PACKAGE = 'migrations'
+MIGRATION_NAME = re.compile(r'(\d{4})_(\w+)\.py')
+
+SCHEMA_VERSION_DDL = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    applied_at DATETIME NOT NULL
+)"""
+
+Migration = namedtuple('Migration', ['version', 'name'])
+
+
+def migrations_dir():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), MIGRATIONS_PACKAGE)
+
+
+# Every migration shipped with the code, oldest first
+def available_migrations():
+    found = []
+    for filename in os.listdir(migrations_dir()):
+        match = MIGRATION_NAME.fullmatch(filename)
+        if match:
+            found.append(Migration(int(match.group(1)), match.group(2)))
+    found.sort()
+    versions = [migration.version for migration in found]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Two migrations share a version number: {versions}")
+    return found
+
+
+# Versions recorded in schema_version; empty for a database never migrated.
+# Only reads, so it is cheap enough to run at startup.
+def applied_versions(connection):
+    if not inspect(connection).has_table('schema_version'):
+        return set()
+    return {version for (version,) in connection.execute(text("SELECT version FROM schema_version"))}
+
+
+def pending_migrations(engine):
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    return [migration for migration in available_migrations() if migration.version not in applied]
+
+
+# Apply the pending migrations in order, each in its own transaction together
+# with its schema_version row. SQLite runs some DDL outside the transaction,
+# so migrations are written to be safe to re-run (IF NOT EXISTS and the like).
+# Returns the migrations applied.
+def upgrade(engine):
+    pending = pending_migrations(engine)
+    if not pending:
+        return []
+    with engine.begin() as connection:
+        connection.execute(text(SCHEMA_VERSION_DDL))
+
+    applied = []
+    for migration in pending:
+        module = importlib.import_module(f"{MIGRATIONS_PACKAGE}.{migration.version:04d}_{migration.name}")
+        with engine.begin() as connection:
+            # Another process may have applied it in the meantime
+            if migration.version in applied_versions(connection):
+                continue
+            module.upgrade(connection)
+            connection.execute(
+                text("INSERT INTO schema_version (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {'version': migration.version, 'name': migration.name, 'applied_at': datetime.utcnow()}
+            )
+        applied.append(migration)
+    return applied
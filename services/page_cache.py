@@ -0,0 +1,76 @@
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from extensions import content_changed
+from services.lru_cache import LRUCache
+
+# Response headers that must never be replayed to another visitor
+UNCACHEABLE_HEADERS = {'set-cookie', 'content-length'}
+
+
+# In-memory store of rendered public pages, cleared whenever content changes
+class PageCache(LRUCache):
+    def __init__(self, max_entries=256):
+        super().__init__(max_entries)
+        self._generation = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def set(self, key, entry, generation):
+        with self._lock:
+            # A page rendered before the last eviction may hold stale content
+            if generation == self._generation:
+                self._store(key, entry, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+page_cache = PageCache()
+
+
+@content_changed.connect
+def evict_pages(sender, **extra):
+    page_cache.clear()
+
+
+def login_state():
+    if not current_user.is_authenticated:
+        return 'anonymous'
+    return current_user.get_id()
+
+
+# Serve a GET view from the page cache, keyed by route and login state
+def cached_page(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Pending flash messages are rendered into the page, so never cache around them
+        if (request.method != 'GET'
+                or not current_app.config.get('PAGE_CACHE_ENABLED', True)
+                or session.get('_flashes')):
+            return f(*args, **kwargs)
+
+        key = (request.endpoint, request.full_path, login_state())
+        entry = page_cache.get(key)
+        if entry is not None:
+            body, status, headers, encoded_bodies = entry
+            response = current_app.response_class(body, status=status, headers=headers)
+            # Compressed copies of body, filled in by compress_response
+            response.encoded_bodies = encoded_bodies
+            return response
+
+        generation = page_cache.generation
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            headers = [(name, value) for name, value in response.headers
+                       if name.lower() not in UNCACHEABLE_HEADERS]
+            response.encoded_bodies = {}
+            page_cache.set(key, (response.get_data(), response.status_code, headers, response.encoded_bodies), generation)
+        return response
+    return decorated_function
@@ -0,0 +1,50 @@
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+# One page of keyset-paginated results; cursors are None at either end
+KeysetPage = namedtuple('KeysetPage', ['items', 'newer', 'older'])
+
+
+def encode_cursor(date, item_id):
+    return f"{date.strftime('%Y%m%d%H%M%S%f')}-{item_id}"
+
+
+def decode_cursor(cursor):
+    try:
+        date, item_id = cursor.split('-')
+        return datetime.strptime(date, '%Y%m%d%H%M%S%f'), int(item_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+# Page through a query newest first on (date, id) without OFFSET. 'before'
+# continues towards older rows, 'after' goes back towards newer ones.
+def keyset_paginate(query, date_column, id_column, per_page, before=None, after=None):
+    key = tuple_(date_column, id_column)
+    before = decode_cursor(before) if before else None
+    after = decode_cursor(after) if after else None
+
+    if after:
+        rows = (query.filter(key > after)
+                .order_by(date_column.asc(), id_column.asc())
+                .limit(per_page + 1).all())
+        has_more_newer = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_more_older = True
+    else:
+        if before:
+            query = query.filter(key < before)
+        rows = (query.order_by(date_column.desc(), id_column.desc())
+                .limit(per_page + 1).all())
+        items = rows[:per_page]
+        has_more_older = len(rows) > per_page
+        has_more_newer = before is not None
+
+    newer = older = None
+    if items and has_more_newer:
+        newer = encode_cursor(getattr(items[0], date_column.key), getattr(items[0], id_column.key))
+    if items and has_more_older:
+        older = encode_cursor(getattr(items[-1], date_column.key), getattr(items[-1], id_column.key))
+    return KeysetPage(items, newer, older)
@@ -0,0 +1,96 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import literal, select, union_all
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from extensions import db
+from services.principals import PRINCIPAL_MODELS
+from services.process_local import ProcessLocal
+
+
+# Raised when too many password checks are already running or queued
+class PasswordCheckBusy(Exception):
+    pass
+
+
+_pool = ProcessLocal()
+_dummy_hash = None
+
+
+def make_pool():
+    config = current_app.config
+    executor = ThreadPoolExecutor(max_workers=config.get('PASSWORD_HASH_WORKERS', 2),
+                                  thread_name_prefix='password-hash')
+    # Checks running plus waiting; anything beyond this is turned away
+    slots = threading.BoundedSemaphore(config.get('PASSWORD_HASH_MAX_PENDING', 8))
+    return executor, slots
+
+
+def get_executor():
+    return _pool.get(make_pool)
+
+
+def hash_method():
+    return current_app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=hash_method())
+
+
+# Stored hashes look like "method$salt$hash"; anything not made with the
+# configured method is upgraded the next time its password is verified
+def needs_rehash(password_hash, method):
+    return password_hash.split('$', 1)[0] != method
+
+
+def verify_and_rehash(password_hash, password, method):
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if needs_rehash(password_hash, method):
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+# Look up the account for an email across the admin and user tables in one query
+def find_account(email, kinds):
+    queries = [
+        select(literal(kind).label('kind'), model.id, model.password).where(model.email == email)
+        for kind, model in PRINCIPAL_MODELS.items() if kind in kinds
+    ]
+    # Admin wins if the same email exists in both tables, as it always has
+    return db.session.execute(union_all(*queries)).all() if queries else []
+
+
+# Check a login attempt off the request thread. Returns the Admin/User on
+# success and None otherwise; raises PasswordCheckBusy when the pool is saturated.
+def authenticate(email, password, kinds=('admin', 'user')):
+    global _dummy_hash
+    executor, slots = get_executor()
+    if not slots.acquire(timeout=current_app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2)):
+        raise PasswordCheckBusy()
+
+    try:
+        method = hash_method()
+        accounts = sorted(find_account(email, kinds), key=lambda row: row.kind != 'admin')
+        if not accounts:
+            # Spend the same time on unknown emails so they can't be told apart
+            if _dummy_hash is None:
+                _dummy_hash = generate_password_hash('', method=method)
+            executor.submit(check_password_hash, _dummy_hash, password).result()
+            return None
+
+        kind, account_id, password_hash = accounts[0]
+        valid, new_hash = executor.submit(verify_and_rehash, password_hash, password, method).result()
+    finally:
+        slots.release()
+
+    if not valid:
+        return None
+    principal = db.session.get(PRINCIPAL_MODELS[kind], account_id)
+    if new_hash:
+        principal.password = new_hash
+        db.session.commit()
+    return principal
@@ -0,0 +1,60 @@
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.models import Admin, User
+from services.lru_cache import LRUCache
+
+# Session id namespace -> model
+PRINCIPAL_MODELS = {'admin': Admin, 'user': User}
+
+
+# Logged-in accounts by session id, so Flask-Login doesn't hit the database on
+# every request; entries expire after PRINCIPAL_CACHE_TTL and are dropped when
+# the account changes
+principal_cache = LRUCache()
+
+
+# Flask-Login user loader: one primary-key lookup on the namespaced model
+def load_principal(identity):
+    principal = principal_cache.get(identity)
+    if principal is not None:
+        return principal
+
+    kind, _, pk = identity.partition(':')
+    model = PRINCIPAL_MODELS.get(kind)
+    if model is None or not pk.isdigit():
+        # Sessions from before ids were namespaced; the visitor logs in again
+        return None
+
+    principal = db.session.get(model, int(pk))
+    if principal is None:
+        return None
+
+    # Detach it so the cached copy can be shared between requests
+    db.session.expunge(principal)
+    config = current_app.config
+    principal_cache.max_entries = config.get('PRINCIPAL_CACHE_SIZE', 256)
+    principal_cache.set(identity, principal, timeout=config.get('PRINCIPAL_CACHE_TTL', 60))
+    return principal
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_principal_changes(session, flush_context):
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, (Admin, User)):
+            session.info.setdefault('principals_changed', set()).add(obj.get_id())
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_principals(session):
+    for identity in session.info.pop('principals_changed', ()):
+        principal_cache.pop(identity)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_principal_changes(session):
+    session.info.pop('principals_changed', None)
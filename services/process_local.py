@@ -0,0 +1,22 @@
+import os
+import threading
+
+
+# A value built on first use in each process. Thread pools and the like can't
+# be shared with a forked server worker, which inherits the parent's objects
+# but none of their threads, so a forked child builds its own.
+class ProcessLocal:
+    def __init__(self):
+        self.reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self, factory):
+        with self._lock:
+            if self._value is None:
+                self._value = factory()
+            return self._value
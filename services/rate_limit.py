@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import time
+
+from flask import current_app
+
+
+# Token buckets keyed by an arbitrary string (IP address, email, ...)
+class TokenBuckets:
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def allow(self, key, burst, per_hour):
+        rate = per_hour / 3600.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, burst, rate)
+            return allowed
+
+    def _prune(self, now, burst, rate):
+        # Buckets that have refilled completely carry no state worth keeping
+        for key, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * rate >= burst:
+                del self._buckets[key]
+
+
+# Two Bloom filters covering the current and previous window, so an item is
+# remembered for between one and two windows without unbounded growth
+class RotatingBloomFilter:
+    def __init__(self, bits=2 ** 20, hashes=4, window=600):
+        self.bits = bits
+        self.hashes = hashes
+        self.window = window
+        self._current = bytearray(bits // 8)
+        self._previous = bytearray(bits // 8)
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _positions(self, item):
+        digest = hashlib.sha256(item.encode('utf-8')).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4:i * 4 + 4], 'big') % self.bits
+
+    def _rotate(self):
+        now = time.monotonic()
+        if now - self._rotated_at >= 2 * self.window:
+            self._previous = bytearray(self.bits // 8)
+            self._current = bytearray(self.bits // 8)
+            self._rotated_at = now
+        elif now - self._rotated_at >= self.window:
+            self._previous = self._current
+            self._current = bytearray(self.bits // 8)
+            self._rotated_at = now
+
+    # Returns True if the item was (probably) seen recently, and remembers it either way
+    def check_and_add(self, item):
+        positions = list(self._positions(item))
+        with self._lock:
+            self._rotate()
+            seen = all(self._current[p // 8] & (1 << p % 8) for p in positions) or \
+                all(self._previous[p // 8] & (1 << p % 8) for p in positions)
+            for p in positions:
+                self._current[p // 8] |= 1 << p % 8
+            return seen
+
+
+ip_buckets = TokenBuckets()
+email_buckets = TokenBuckets()
+_recent_messages = None
+_recent_lock = threading.Lock()
+
+
+def recent_messages():
+    global _recent_messages
+    with _recent_lock:
+        if _recent_messages is None:
+            config = current_app.config
+            _recent_messages = RotatingBloomFilter(bits=config.get('CONTACT_DUPLICATE_FILTER_BITS', 2 ** 20),
+                                                   window=config.get('CONTACT_DUPLICATE_WINDOW', 600))
+        return _recent_messages
+
+
+# Check a contact form submission against the flood limits; returns an error
+# message to show, or None if the submission may proceed
+def check_contact_submission(ip, email, body):
+    config = current_app.config
+    if not config.get('CONTACT_RATE_LIMIT_ENABLED', True):
+        return None
+
+    if not ip_buckets.allow(ip or 'unknown', config.get('CONTACT_IP_BURST', 5), config.get('CONTACT_IP_PER_HOUR', 10)):
+        return 'Too many messages from your network. Please try again later.'
+    if not email_buckets.allow(email.strip().lower(), config.get('CONTACT_EMAIL_BURST', 3), config.get('CONTACT_EMAIL_PER_HOUR', 5)):
+        return 'Too many messages from this email address. Please try again later.'
+
+    normalized = ' '.join(body.lower().split())
+    if recent_messages().check_and_add(normalized):
+        return 'This message has already been received.'
+    return None
@@ -0,0 +1,48 @@
+from flask import current_app
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+from extensions import db
+from models.models import Message
+
+# The messages_fts index and its triggers are created by the initial schema migration
+
+# Control characters that can't appear in form input, used to mark matches in snippets
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+
+# Turn free text into an FTS5 query: every word must match, the last one as a prefix
+def build_match_query(query):
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    if not terms:
+        return None
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    return Markup(str(escape(snippet)).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+
+# Ranked full-text search over contact messages; returns (messages, {id: snippet})
+def search_messages(query, limit=None):
+    match = build_match_query(query)
+    if match is None:
+        return [], {}
+    limit = limit or current_app.config.get('MESSAGE_SEARCH_LIMIT', 50)
+
+    rows = db.session.execute(
+        text("""SELECT rowid, snippet(messages_fts, -1, :start, :end, '…', 16)
+                FROM messages_fts
+                WHERE messages_fts MATCH :match
+                ORDER BY rank
+                LIMIT :limit"""),
+        {'start': MATCH_START, 'end': MATCH_END, 'match': match, 'limit': limit}
+    ).all()
+
+    ids = [row[0] for row in rows]
+    by_id = {message.id: message for message in Message.query.filter(Message.id.in_(ids)).all()}
+    messages = [by_id[message_id] for message_id in ids if message_id in by_id]
+    snippets = {message_id: highlight(snippet) for message_id, snippet in rows}
+    return messages, snippets
@@ -0,0 +1,50 @@
+import os
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+
+if BaseApplication is not None:
+    # gunicorn serving an app that is already built and warmed up: the master
+    # forks the workers from it and init_worker runs in each after its fork
+    class GunicornServer(BaseApplication):
+        def __init__(self, app, options):
+            self.application = app
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for name, value in self.options.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return self.application
+
+
+# Serve with gunicorn's pre-forking threaded workers, or with waitress (a
+# single process) where gunicorn can't run, i.e. on Windows.
+# init_worker(app) runs in every worker process before it serves.
+def serve(app, host, port, processes, threads, init_worker):
+    if BaseApplication is not None and os.name != 'nt':
+        GunicornServer(app, {
+            'bind': f"[{host}]:{port}" if ':' in host else f"{host}:{port}",
+            'workers': processes,
+            'threads': threads,
+            'worker_class': 'gthread',
+            'post_fork': lambda server, worker: init_worker(app),
+        }).run()
+    elif waitress is not None:
+        if processes > 1:
+            app.logger.warning("waitress runs a single process; --processes is ignored")
+        init_worker(app)
+        waitress.serve(app, host=host, port=port, threads=threads)
+    else:
+        raise RuntimeError("The serve command needs gunicorn (Linux/macOS) or waitress (Windows); "
+                           "pip install -r requirements.txt")
@@ -0,0 +1,195 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from extensions import content_changed
+from models.models import SiteImage, ContactInfo, Project, Skill, Certificate, Education, Experience, ImageDerivative
+from services.content_version import content_versions
+from services.jobs import get_executor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Public endpoints written to the export -> models their content comes from.
+# Matches the conditional_page declarations in routes.py.
+EXPORT_PAGES = {
+    'main.home': (SiteImage, ImageDerivative),
+    'main.about': (SiteImage, Education, Experience, ImageDerivative),
+    'main.projects': (Project, ImageDerivative),
+    'main.skills': (Skill, ImageDerivative),
+    'main.certificates': (Certificate, ImageDerivative),
+    'main.contact': (ContactInfo,),
+}
+
+# Directories under static/ that pages never link: the blob store (uploads
+# are linked under images/ and files/) and the vendor sources
+SKIP_STATIC_DIRS = {'blobs', 'vendor'}
+
+# The export directory is a symlink to the current release, so nginx never
+# sees a half-written tree. A location serving it might look like:
+#
+#   location / {
+#       # Visitors with a session (admins, pending flash messages) get live pages
+#       if ($cookie_session) { proxy_pass http://app; }
+#       try_files /export$uri/index.html /export$uri @app;
+#   }
+#
+# with POST /contact, /login, /admin and /download-resume proxied to the app
+# (with X-Forwarded-For set; see TRUSTED_PROXIES).
+
+
+def releases_dir(export_dir):
+    return export_dir.rstrip('/\\') + '.releases'
+
+
+# Paths of the URLs an endpoint answers without arguments ('/', '/home')
+def page_urls(app, endpoint):
+    return sorted(rule.rule for rule in app.url_map.iter_rules()
+                  if rule.endpoint == endpoint and not rule.arguments and 'GET' in rule.methods)
+
+
+# /about -> about/index.html, / -> index.html
+def page_file(url):
+    return os.path.join(*[part for part in url.split('/') if part], 'index.html')
+
+
+# Hard-link a file into a release, copying across filesystems
+def link_file(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def mirror_static(static_folder, target):
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if dirpath == static_folder:
+            dirnames[:] = [name for name in dirnames if name not in SKIP_STATIC_DIRS]
+        relative = os.path.relpath(dirpath, static_folder)
+        for name in filenames:
+            link_file(os.path.join(dirpath, name), os.path.join(target, 'static', relative, name))
+
+
+# Point the export symlink at release in one rename
+def swap(export_dir, release):
+    temp_link = f"{export_dir}.{os.getpid()}.tmp"
+    os.symlink(release, temp_link)
+    os.replace(temp_link, export_dir)
+
+
+# Remove all but the newest `keep` releases, never the current one
+def prune(export_dir, keep):
+    root = releases_dir(export_dir)
+    current = os.path.realpath(export_dir)
+    releases = sorted(name for name in os.listdir(root) if not name.startswith('.'))
+    for name in releases[:-keep] if keep else releases:
+        path = os.path.join(root, name)
+        if os.path.realpath(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# Render the public pages into a new release and switch the export to it.
+# Only `endpoints` are rendered (all of them if None or if there is no
+# previous release); the other pages are linked from the current release.
+# Returns the endpoints rendered.
+def export_site(app, endpoints=None):
+    export_dir = os.path.abspath(app.config['STATIC_EXPORT_DIR'])
+    root = releases_dir(export_dir)
+    os.makedirs(root, exist_ok=True)
+
+    with open(os.path.join(root, '.lock'), 'w') as lock:
+        # One export at a time across processes, so none starts from a release
+        # that another is about to replace
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+        previous = os.path.realpath(export_dir) if os.path.islink(export_dir) else None
+        if previous is None or endpoints is None:
+            endpoints = set(EXPORT_PAGES)
+        # Names sort in creation order, even for exports within one second
+        now = time.time_ns()
+        prefix = time.strftime('%Y%m%d%H%M%S', time.localtime(now // 10**9)) + f"{now % 10**9:09d}-"
+        release = tempfile.mkdtemp(dir=root, prefix=prefix)
+        try:
+            mirror_static(app.static_folder, release)
+            client = app.test_client()
+            for endpoint in EXPORT_PAGES:
+                for url in page_urls(app, endpoint):
+                    target = os.path.join(release, page_file(url))
+                    if endpoint not in endpoints and os.path.exists(os.path.join(previous, page_file(url))):
+                        link_file(os.path.join(previous, page_file(url)), target)
+                        continue
+                    response = client.get(url)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{url} returned {response.status_code}")
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with open(target, 'wb') as f:
+                        f.write(response.get_data())
+            os.chmod(release, 0o755)
+            swap(export_dir, release)
+        except BaseException:
+            shutil.rmtree(release, ignore_errors=True)
+            raise
+        prune(export_dir, app.config.get('STATIC_EXPORT_KEEP', 3))
+    return endpoints
+
+
+# Regenerates the export in the background after content commits. Commits
+# arriving while an export runs are folded into the next one.
+class StaticExporter:
+    def __init__(self):
+        self._pending = set()
+        self._running = False
+        self._lock = threading.Lock()
+
+    def schedule(self, app, endpoints):
+        with self._lock:
+            self._pending |= endpoints
+            if self._running:
+                return
+            self._running = True
+        get_executor(app).submit(self.run, app)
+
+    def run(self, app):
+        while True:
+            with self._lock:
+                endpoints, self._pending = self._pending, set()
+                if not endpoints:
+                    self._running = False
+                    return
+            try:
+                export_site(app, endpoints)
+                app.logger.info(f"Static export regenerated: {', '.join(sorted(endpoints))}")
+            except Exception:
+                app.logger.exception("Static export failed")
+
+    # An export running in a parent process never finishes in a forked worker
+    def forget_pending(self):
+        self._pending = set()
+        self._running = False
+        self._lock = threading.Lock()
+
+
+exporter = StaticExporter()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=exporter.forget_pending)
+
+
+# Re-render the pages showing the tables a commit touched. Only the process
+# that made the commit reacts; the others learn of it through polling.
+@content_changed.connect
+def regenerate_export(sender, tables=frozenset(), **extra):
+    if sender is content_versions or not has_app_context() or not current_app.config.get('STATIC_EXPORT_DIR'):
+        return
+    endpoints = {endpoint for endpoint, models in EXPORT_PAGES.items()
+                 if tables & {model.__tablename__ for model in models}}
+    if endpoints:
+        exporter.schedule(current_app._get_current_object(), endpoints)
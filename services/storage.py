@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+from flask import current_app, url_for
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+# What stat() reports about a stored file; mtime in epoch seconds, etag may be None
+StoredFile = namedtuple('StoredFile', ['size', 'mtime', 'etag'])
+
+# Bytes of a downloaded object kept in memory before get() spills to disk
+GET_SPOOL_SIZE = 1024 * 1024
+
+
+# Files under static/, served by the app's static route as before
+class LocalStorage:
+    local = True
+
+    def __init__(self, root):
+        self.root = root
+
+    @classmethod
+    def from_app(cls, app):
+        return cls(app.static_folder)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    # Write fileobj to key atomically. Spooled uploads are renamed into place
+    # instead of copied.
+    def put(self, key, fileobj, content_type=None):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if hasattr(fileobj, 'move_to'):
+            fileobj.move_to(path)
+            return
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(fileobj, f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    # Readable binary file; raises FileNotFoundError for a missing key
+    def get(self, key):
+        return open(self.path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key, download_name=None, expires=None):
+        return url_for('static', filename=key)
+
+    def stat(self, key):
+        try:
+            stat = os.stat(self.path(key))
+        except OSError:
+            return None
+        return StoredFile(size=stat.st_size, mtime=stat.st_mtime, etag=None)
+
+
+# Objects in an S3-compatible bucket. Large files go up as multipart uploads
+# and clients fetch them straight from the bucket through presigned GET URLs,
+# or through STORAGE_PUBLIC_URL when the bucket sits behind a CDN. Set
+# STORAGE_S3_ENDPOINT to use MinIO or another local stand-in instead of AWS.
+class S3Storage:
+    local = False
+
+    def __init__(self, bucket, endpoint_url=None, region=None, public_url=None, expires=3600,
+                 multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND 's3' needs boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.expires = expires
+        # Stand-ins like MinIO only answer path-style requests
+        config = Config(signature_version='s3v4', s3={'addressing_style': 'path' if endpoint_url else 'auto'})
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region, config=config)
+        self.transfer = TransferConfig(multipart_threshold=multipart_threshold,
+                                       multipart_chunksize=multipart_chunksize)
+
+    @classmethod
+    def from_app(cls, app):
+        config = app.config
+        return cls(config['STORAGE_S3_BUCKET'],
+                   endpoint_url=config.get('STORAGE_S3_ENDPOINT'),
+                   region=config.get('STORAGE_S3_REGION'),
+                   public_url=config.get('STORAGE_PUBLIC_URL'),
+                   expires=config.get('STORAGE_URL_EXPIRES', 3600),
+                   multipart_threshold=config.get('STORAGE_MULTIPART_THRESHOLD', 8 * 1024 * 1024),
+                   multipart_chunksize=config.get('STORAGE_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+
+    @staticmethod
+    def not_found(error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    # Every key written by the app is content-addressed or randomly named and
+    # never rewritten, so objects are cached as immutable
+    def put(self, key, fileobj, content_type=None):
+        extra = {'CacheControl': 'public, max-age=31536000, immutable'}
+        if content_type:
+            extra['ContentType'] = content_type
+        if fileobj.seekable():
+            fileobj.seek(0)
+        self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs=extra, Config=self.transfer)
+
+    def get(self, key):
+        spool = tempfile.SpooledTemporaryFile(max_size=GET_SPOOL_SIZE)
+        try:
+            self.client.download_fileobj(self.bucket, key, spool, Config=self.transfer)
+        except ClientError as e:
+            spool.close()
+            if self.not_found(e):
+                raise FileNotFoundError(key)
+            raise
+        spool.seek(0)
+        return spool
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url(self, key, download_name=None, expires=None):
+        params = {'Bucket': self.bucket, 'Key': key}
+        if download_name:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+        elif self.public_url:
+            return f"{self.public_url}/{key}"
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires or self.expires)
+
+    def stat(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if self.not_found(e):
+                return None
+            raise
+        return StoredFile(size=head['ContentLength'], mtime=head['LastModified'].timestamp(),
+                          etag=head.get('ETag', '').strip('"') or None)
+
+
+# STORAGE_BACKEND value -> driver class; a driver provides from_app, put, get,
+# delete, url, stat and a 'local' flag telling whether files live under static/
+BACKENDS = {
+    'local': LocalStorage,
+    's3': S3Storage,
+}
+
+
+# The storage driver for the current app, created on first use
+def get_storage():
+    app = current_app._get_current_object()
+    storage = app.extensions.get('storage')
+    if storage is None:
+        backend = app.config.get('STORAGE_BACKEND', 'local')
+        if backend not in BACKENDS:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND {backend!r}")
+        storage = app.extensions.setdefault('storage', BACKENDS[backend].from_app(app))
+    return storage
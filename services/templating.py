@@ -0,0 +1,105 @@
+import os
+
+from flask import current_app, has_app_context
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from extensions import content_changed
+from services.lru_cache import LRUCache
+
+
+# In-process store of rendered fragments
+class MemoryFragmentCache(LRUCache):
+    @classmethod
+    def from_app(cls, app):
+        return cls(app.config.get('FRAGMENT_CACHE_SIZE', 1024))
+
+
+# Renders every fragment; for turning the cache off
+class NullFragmentCache:
+    @classmethod
+    def from_app(cls, app):
+        return cls()
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def clear(self):
+        pass
+
+
+# FRAGMENT_CACHE_BACKEND value -> backend class; a backend provides from_app,
+# get, set(key, value, timeout) and clear
+FRAGMENT_CACHES = {
+    'memory': MemoryFragmentCache,
+    'null': NullFragmentCache,
+}
+
+
+# The fragment cache for the current app, created on first use
+def get_fragment_cache():
+    app = current_app._get_current_object()
+    cache = app.extensions.get('fragment_cache')
+    if cache is None:
+        backend = app.config.get('FRAGMENT_CACHE_BACKEND', 'memory')
+        if backend not in FRAGMENT_CACHES:
+            raise RuntimeError(f"Unknown FRAGMENT_CACHE_BACKEND {backend!r}")
+        cache = app.extensions.setdefault('fragment_cache', FRAGMENT_CACHES[backend].from_app(app))
+    return cache
+
+
+# {% cache 'navbar', login_state() %}...{% endcache %} renders its body once
+# per distinct set of key values and reuses the markup afterwards. The body
+# must depend on nothing but those values; the cache is also emptied whenever
+# content changes.
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        # Fragments in different places never share an entry
+        key = [nodes.Const(f"{parser.name}:{lineno}"), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.Tuple(key, 'load')]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        # Edited templates are reloaded while debugging, so render them fresh
+        if self.environment.auto_reload:
+            return caller()
+        cache = get_fragment_cache()
+        key = '|'.join(str(part) for part in key)
+        value = cache.get(key)
+        if value is None:
+            value = str(caller())
+            cache.set(key, value, current_app.config.get('FRAGMENT_CACHE_TIMEOUT'))
+        return Markup(value)
+
+
+@content_changed.connect
+def clear_fragments(sender, **extra):
+    if has_app_context() and 'fragment_cache' in current_app.extensions:
+        current_app.extensions['fragment_cache'].clear()
+
+
+# Compiled templates are kept on disk and shared by every worker process, so a
+# fresh worker loads bytecode instead of compiling. Jinja checks each entry
+# against the template source and writes files atomically.
+def init_templates(app):
+    directory = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+
+# Compile every template into the bytecode cache and the environment's
+# in-memory cache, which forked workers inherit
+def compile_templates(app):
+    for name in app.jinja_env.list_templates(extensions=('html',)):
+        app.jinja_env.get_template(name)
@@ -0,0 +1,428 @@
+import errno
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+
+from flask import Request, current_app, has_app_context, url_for
+from sqlalchemy import delete, event, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, attributes
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from extensions import db
+from models.models import Blob, ImageDerivative, Project, Skill, Certificate, Education, SiteImage, Resume
+from services.assets import discard_asset, file_hash, static_path
+from services.jobs import get_executor
+from services.storage import get_storage
+
+# Model -> (filename column, directory under static/ the filename is relative to)
+UPLOAD_FIELDS = {
+    Project: ('image', 'images/projects'),
+    Skill: ('image', 'images/skills'),
+    Certificate: ('image', 'images/certificates'),
+    Education: ('image', 'images/education'),
+    SiteImage: ('filename', 'images'),
+    Resume: ('filename', 'files'),
+}
+
+# Content-addressed store under static/, sharded by the first two digest characters
+BLOB_DIR = 'blobs'
+
+BLOB_NAME = re.compile(r'([0-9a-f]{64})(\.[A-Za-z0-9]+)?')
+
+# Names given to uploads before the blob store (secrets.token_hex(8) + extension)
+LEGACY_UPLOAD_NAME = re.compile(r'[0-9a-f]{16}\.[A-Za-z0-9]+')
+
+# Any file named by the upload code: random or digest names, optionally with a
+# variant width. Shipped files like profile.jpg never match.
+UPLOAD_FILE = re.compile(r'(?:[0-9a-f]{16}|[0-9a-f]{64})(?:-\d+w)?\.[A-Za-z0-9]+')
+
+# Accepted upload extensions -> kind, which picks the size limit and magic bytes
+UPLOAD_KINDS = {'.jpg': 'image', '.jpeg': 'image', '.png': 'image', '.gif': 'image', '.pdf': 'pdf'}
+
+# Leading bytes of each accepted kind
+MAGIC_BYTES = {
+    'image': (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a'),
+    'pdf': (b'%PDF-',),
+}
+SNIFF_BYTES = 8
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING
+INSERT_IGNORING_CONFLICTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def spool_dir():
+    return current_app.config.get('UPLOAD_SPOOL_DIR') or os.path.join(current_app.instance_path, 'upload-spool')
+
+
+def blob_key(digest, extension):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}{extension}"
+
+
+def blob_path(digest, extension):
+    return static_path(blob_key(digest, extension))
+
+
+def blob_digest(filename):
+    match = BLOB_NAME.fullmatch(filename or '')
+    return match.group(1) if match else None
+
+
+# Storage key of a file under static/ (e.g. "images/projects/<digest>.png").
+# Digest-named uploads are stored once as their blob; anything else, like
+# legacy uploads and image variants, under its own path.
+def storage_key(path):
+    directory, _, name = path.rpartition('/')
+    digest = blob_digest(name)
+    return blob_key(digest, name[len(digest):]) if digest else path
+
+
+# Where a browser fetches an upload kept in remote storage: the public bucket
+# URL, or the app's /media route which redirects to a fresh presigned URL so
+# cached pages never carry an expired one. None for local storage.
+def remote_upload_url(path):
+    storage = get_storage()
+    if storage.local or not UPLOAD_FILE.fullmatch(path.rsplit('/', 1)[-1]):
+        return None
+    key = storage_key(path)
+    if storage.public_url:
+        return storage.url(key)
+    return url_for('main.media', key=key)
+
+
+# Expose a blob under an upload directory; a hard link shares the bytes on disk
+def link_blob(path, target):
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(path, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(path, target)
+
+
+# Receives one uploaded file while the form is parsed: hashes it, enforces the
+# size limit for its kind and checks its magic bytes as the bytes arrive. Up to
+# UPLOAD_SPOOL_SIZE stays in memory, the rest goes to a named file in
+# UPLOAD_SPOOL_DIR, outside static/ so a half-received upload is never served,
+# from where store_upload renames it into place.
+class UploadSpool(tempfile.SpooledTemporaryFile):
+    def __init__(self, kind, max_bytes, max_size, directory):
+        super().__init__(max_size=max_size, mode='w+b')
+        self.kind = kind
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.path = None
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._head = b''
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Uploads of this type are limited to {self.max_bytes / (1024 * 1024):g} MB.")
+        if len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self.sniff()
+        self.sha256.update(data)
+        return super().write(data)
+
+    def sniff(self):
+        if not self._head.startswith(MAGIC_BYTES[self.kind]):
+            raise UnsupportedMediaType(f"The uploaded file is not a valid {self.kind.upper() if self.kind == 'pdf' else self.kind}.")
+
+    def rollover(self):
+        if self._rolled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=self.directory, suffix='.upload')
+        memory = self._file
+        self._file = os.fdopen(fd, 'w+b')
+        self._file.write(memory.getvalue())
+        self._file.seek(memory.tell())
+        self._rolled = True
+
+    # Atomically move the received bytes to path. A rename when the spool
+    # directory is on the same filesystem, else a copy renamed into place.
+    def move_to(self, path):
+        if len(self._head) < SNIFF_BYTES:
+            self.sniff()
+        if not self._rolled:
+            self.rollover()
+        self._file.close()
+        try:
+            os.replace(self.path, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.upload')
+            os.close(fd)
+            shutil.copyfile(self.path, temp_path)
+            os.replace(temp_path, path)
+            os.remove(self.path)
+        self.path = None
+
+    def close(self):
+        super().close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+            self.path = None
+
+
+# Request class whose multipart parser streams files into UploadSpools, so
+# oversized or mislabelled uploads are refused before they are read in full
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not filename:
+            # An empty file input
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        kind = UPLOAD_KINDS.get(os.path.splitext(filename)[1].lower())
+        if kind is None:
+            raise UnsupportedMediaType('Only JPG, PNG, GIF and PDF files can be uploaded.')
+        config = current_app.config
+        return UploadSpool(kind,
+                           max_bytes=config.get('UPLOAD_SIZE_LIMITS', {}).get(kind, 10 * 1024 * 1024),
+                           max_size=config.get('UPLOAD_SPOOL_SIZE', 1024 * 1024),
+                           directory=spool_dir())
+
+
+# Record a blob unless it exists. Two requests storing the same file at once
+# both insert, and the database drops the second row instead of failing.
+def add_blob(digest, extension, size):
+    insert = INSERT_IGNORING_CONFLICTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        db.session.execute(insert(Blob).values(digest=digest, extension=extension, size=size, refcount=0)
+                           .on_conflict_do_nothing(index_elements=['digest']))
+    elif db.session.get(Blob, digest) is None:
+        db.session.add(Blob(digest=digest, extension=extension, size=size, refcount=0))
+
+
+# Save an uploaded file under <directory>/<sha256><ext>. Identical uploads
+# share one blob. Returns the filename for the model.
+def store_upload(file, directory):
+    extension = os.path.splitext(file.filename)[1].lower()
+
+    spool = file.stream
+    if not isinstance(spool, UploadSpool):
+        # Not parsed by UploadRequest (e.g. a file built in code); spool it here
+        spool = UploadSpool(UPLOAD_KINDS.get(extension, 'image'), float('inf'),
+                            current_app.config.get('UPLOAD_SPOOL_SIZE', 1024 * 1024), spool_dir())
+        shutil.copyfileobj(file.stream, spool)
+
+    digest = spool.sha256.hexdigest()
+    filename = digest + extension
+    storage = get_storage()
+    if not storage.local:
+        # Recorded before the check: the insert holds the database's write
+        # lock until the upload commits, so release_blob can't remove the
+        # object in between
+        add_blob(digest, extension, spool.size)
+        key = blob_key(digest, extension)
+        if storage.stat(key) is None:
+            storage.put(key, spool, content_type=mimetypes.guess_type(filename)[0])
+        spool.close()
+        return filename
+
+    path = blob_path(digest, extension)
+    if os.path.exists(path):
+        # Already stored; the spooled copy is dropped when the request closes it
+        spool.close()
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        spool.move_to(path)
+
+    link_blob(path, static_path(f"{directory}/{filename}"))
+    add_blob(digest, extension, spool.size)
+    return filename
+
+
+# Whether any row still refers to <directory>/<filename>; the session is flushed first
+def upload_in_use(directory, filename):
+    db.session.flush()
+    for model, (field, model_directory) in UPLOAD_FIELDS.items():
+        if model_directory == directory and model.query.filter(getattr(model, field) == filename).first():
+            return True
+    return False
+
+
+# Assigning a filename loads the one it replaces even when the row was expired
+# by a commit; otherwise the old blob would never lose its reference
+def load_replaced_filename(target, value, oldvalue, initiator):
+    pass
+
+
+for model, (field, _) in UPLOAD_FIELDS.items():
+    event.listen(getattr(model, field), 'set', load_replaced_filename, active_history=True)
+
+
+# Reference counts follow the filename columns. Changes are gathered before the
+# flush, while old values can still be loaded, and written once rows are inserted.
+@event.listens_for(Session, 'before_flush')
+def collect_blob_references(session, flush_context, instances):
+    deltas = session.info.setdefault('blob_refcounts', {})
+
+    def count(filename, delta):
+        digest = blob_digest(filename)
+        if digest:
+            deltas[digest] = deltas.get(digest, 0) + delta
+
+    for obj in session.new:
+        if type(obj) in UPLOAD_FIELDS:
+            count(getattr(obj, UPLOAD_FIELDS[type(obj)][0]), 1)
+    for obj in session.deleted:
+        if type(obj) in UPLOAD_FIELDS:
+            count(getattr(obj, UPLOAD_FIELDS[type(obj)][0]), -1)
+    for obj in session.dirty:
+        if type(obj) in UPLOAD_FIELDS:
+            history = attributes.get_history(obj, UPLOAD_FIELDS[type(obj)][0])
+            for filename in history.added:
+                count(filename, 1)
+            for filename in history.deleted:
+                count(filename, -1)
+
+
+@event.listens_for(Session, 'after_flush')
+def apply_blob_references(session, flush_context):
+    deltas = session.info.pop('blob_refcounts', None)
+    for digest, delta in (deltas or {}).items():
+        if delta:
+            session.connection().execute(
+                update(Blob.__table__).where(Blob.digest == digest).values(refcount=Blob.refcount + delta)
+            )
+        if delta < 0:
+            session.info.setdefault('released_blobs', set()).add(digest)
+
+
+# Blobs in remote storage are deleted once a commit drops their last
+# reference. Local blobs are left to the garbage collector, whose grace period
+# covers uploads linked to a blob before their row commits.
+@event.listens_for(Session, 'after_commit')
+def schedule_blob_release(session):
+    digests = session.info.pop('released_blobs', None)
+    if digests and has_app_context() and not get_storage().local:
+        app = current_app._get_current_object()
+        get_executor(app).submit(release_blobs, app, digests)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_blob_release(session):
+    session.info.pop('released_blobs', None)
+
+
+def release_blobs(app, digests):
+    with app.app_context():
+        for digest in digests:
+            try:
+                release_blob(digest)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception(f"Deleting blob {digest} failed")
+
+
+# Delete a blob nothing refers to from storage and from blobs. The row is
+# deleted first and committed last, so an upload of the same file waits for
+# the database lock and then stores it again. Returns whether it was deleted.
+def release_blob(digest):
+    blob = db.session.get(Blob, digest)
+    if blob is None:
+        return False
+    key = blob_key(digest, blob.extension)
+    removed = db.session.execute(
+        delete(Blob.__table__).where(Blob.digest == digest, Blob.refcount <= 0)
+    ).rowcount
+    if removed:
+        try:
+            get_storage().delete(key)
+        except Exception:
+            db.session.rollback()
+            raise
+    db.session.commit()
+    return bool(removed)
+
+
+# Remove an upload no row in its directory uses any more, with its image
+# variants. Locally that is the upload's link to its blob; the blob goes once
+# its refcount is zero.
+def remove_upload(directory, filename):
+    from services.images import delete_derivatives
+
+    path = f"{directory}/{filename}"
+    if directory.startswith('images'):
+        delete_derivatives(path)
+    storage = get_storage()
+    # Remotely, digest-named uploads exist only as their blob
+    if storage.local or not blob_digest(filename):
+        storage.delete(path)
+    discard_asset(path)
+
+
+# Move uploads saved before the blob store into it: each referenced file is
+# hashed, renamed to its digest and the duplicate copies removed.
+# Returns (files moved, bytes reclaimed).
+def adopt_uploads():
+    from services.images import delete_derivatives
+    from services.jobs import enqueue_once
+
+    moved = 0
+    replaced = []
+    for model, (field, directory) in UPLOAD_FIELDS.items():
+        for row in model.query.all():
+            filename = getattr(row, field)
+            if not filename or blob_digest(filename):
+                continue
+            path = static_path(f"{directory}/{filename}")
+            if not os.path.exists(path):
+                continue
+
+            digest = file_hash(path)
+            extension = os.path.splitext(filename)[1].lower()
+            link_blob(path, blob_path(digest, extension))
+            add_blob(digest, extension, os.path.getsize(path))
+
+            new_filename = digest + extension
+            link_blob(blob_path(digest, extension), static_path(f"{directory}/{new_filename}"))
+            setattr(row, field, new_filename)
+            moved += 1
+            replaced.append((directory, filename))
+            if directory.startswith('images'):
+                delete_derivatives(f"{directory}/{filename}")
+                enqueue_once('image_derivatives', source=f"{directory}/{new_filename}")
+
+    reclaimed = 0
+    for directory, filename in set(replaced):
+        # Files like profile.jpg are also used as template fallbacks; only remove random upload names
+        if LEGACY_UPLOAD_NAME.fullmatch(filename) and not upload_in_use(directory, filename):
+            path = static_path(f"{directory}/{filename}")
+            if os.path.exists(path):
+                if os.stat(path).st_nlink == 1:
+                    reclaimed += os.path.getsize(path)
+                os.remove(path)
+    db.session.commit()
+    return moved, reclaimed
+
+
+# Copy referenced uploads and their image variants from static/ into the
+# configured storage, for switching an existing site to a remote backend.
+# Returns the number of files copied.
+def push_uploads():
+    storage = get_storage()
+    paths = {f"{directory}/{filename}"
+             for model, (field, directory) in UPLOAD_FIELDS.items()
+             for (filename,) in db.session.query(getattr(model, field)).filter(getattr(model, field).isnot(None))}
+    paths |= {filename for (filename,) in db.session.query(ImageDerivative.filename)}
+
+    copied = 0
+    for path in sorted(paths):
+        key = storage_key(path)
+        if not os.path.exists(static_path(path)) or storage.stat(key) is not None:
+            continue
+        with open(static_path(path), 'rb') as f:
+            storage.put(key, f, content_type=mimetypes.guess_type(path)[0])
+        copied += 1
+    return copied
@@ -0,0 +1,226 @@
+import glob
+import os
+import re
+import shutil
+import urllib.request
+
+from flask import current_app
+
+from services.assets import build_asset, static_path
+
+try:
+    from fontTools import subset
+except ImportError:
+    subset = None
+
+# Third-party files bundled in place of the CDN links, in the order base.html loaded them
+VENDOR_CSS = {
+    'bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'fontawesome.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+    'animate.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/animate.css/4.1.1/animate.min.css',
+}
+VENDOR_JS = {
+    'bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+}
+WEBFONTS_URL = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/webfonts/'
+
+# Downloaded originals, relative to static/; kept so rebuilds work offline
+SOURCE_DIR = 'vendor'
+
+# Bundle outputs, relative to static/; picked up by the asset pipeline
+BUNDLE_CSS = 'css/vendor.css'
+BUNDLE_JS = 'js/vendor.js'
+FONT_DIR = 'css/webfonts'
+
+# At-rules whose blocks contain ordinary rules that can be purged
+GROUPING_RULES = ('@media', '@supports', '@layer', '@container')
+
+
+# Path of a vendored original, downloading it the first time
+def fetch(name, url):
+    path = static_path(f"{SOURCE_DIR}/{name}")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response, open(path + '.part', 'wb') as f:
+            shutil.copyfileobj(response, f)
+        os.replace(path + '.part', path)
+    return path
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+# Everything that can reference vendor classes, keyframes or fonts: templates,
+# our own styles and scripts, and the vendor scripts themselves (Bootstrap adds
+# classes like "show" at runtime)
+def content_sources(extra_sources=()):
+    paths = glob.glob(os.path.join(current_app.root_path, 'templates', '**', '*.html'), recursive=True)
+    paths += glob.glob(os.path.join(current_app.static_folder, 'css', '*.css'))
+    paths += glob.glob(os.path.join(current_app.static_folder, 'js', '*.js'))
+    bundles = {os.path.abspath(static_path(BUNDLE_CSS)), os.path.abspath(static_path(BUNDLE_JS))}
+    texts = [read(path) for path in paths if os.path.abspath(path) not in bundles]
+    return '\n'.join(texts + [read(path) for path in extra_sources])
+
+
+# Split a stylesheet into top-level (prelude, block) pairs; block is None for
+# statements such as @charset
+def parse_rules(css):
+    rules = []
+    depth = 0
+    start = 0
+    quote = None
+    for i, c in enumerate(css):
+        if quote:
+            if c == quote and css[i - 1] != '\\':
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c == '{':
+            if depth == 0:
+                block_start = i
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                rules.append((css[start:block_start].strip(), css[block_start + 1:i]))
+                start = i + 1
+        elif c == ';' and depth == 0:
+            rules.append((css[start:i].strip(), None))
+            start = i + 1
+    return rules
+
+
+def split_selectors(prelude):
+    selectors = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(prelude):
+        if c in '([':
+            depth += 1
+        elif c in ')]':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            selectors.append(prelude[start:i].strip())
+            start = i + 1
+    selectors.append(prelude[start:].strip())
+    return selectors
+
+
+# A selector is kept when every class and id it names appears in the templates.
+# Arguments of :not()/:is() and attribute selectors don't count.
+def selector_used(selector, tokens):
+    simple = re.sub(r'\([^()]*\)|\[[^\]]*\]', '', selector)
+    names = re.findall(r'[.#](-?[_a-zA-Z][\w-]*)', simple)
+    return all(name in tokens for name in names)
+
+
+def purge_rules(css, tokens):
+    kept = []
+    for prelude, block in parse_rules(css):
+        if block is None:
+            kept.append(prelude + ';')
+        elif prelude.lower().startswith(GROUPING_RULES):
+            inner = purge_rules(block, tokens)
+            if inner:
+                kept.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith('@'):
+            kept.append(f"{prelude}{{{block}}}")
+        else:
+            selectors = [s for s in split_selectors(prelude) if selector_used(s, tokens)]
+            if selectors:
+                kept.append(f"{','.join(selectors)}{{{block}}}")
+    return ''.join(kept)
+
+
+# Drop @keyframes and @font-face blocks that neither the remaining rules nor
+# the site's own files refer to
+def drop_unused_at_rules(css, content):
+    rules = parse_rules(css)
+    body = content + ''.join(f"{prelude}{{{block}}}" for prelude, block in rules
+                             if block is not None and not prelude.lower().startswith(('@keyframes', '@font-face')))
+    kept = []
+    for prelude, block in rules:
+        if block is None:
+            kept.append(prelude + ';')
+            continue
+        lowered = prelude.lower()
+        if lowered.startswith('@keyframes'):
+            name = prelude.split(None, 1)[1].strip()
+            if not re.search(r'(?<![\w-])' + re.escape(name) + r'(?![\w-])', body):
+                continue
+        elif lowered.startswith('@font-face'):
+            family = re.search(r'font-family\s*:\s*["\']?([^;"\'}]+)', block)
+            if family and family.group(1).strip() not in body:
+                continue
+        kept.append(f"{prelude}{{{block}}}")
+    return ''.join(kept)
+
+
+def purge_css(css, content):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    tokens = set(re.findall(r'[A-Za-z0-9_-]+', content))
+    return drop_unused_at_rules(purge_rules(css, tokens), content)
+
+
+# Subset each Font Awesome webfont the purged CSS still uses to the icons it
+# shows, and point the CSS at the fingerprinted copies
+def bundle_fonts(css):
+    codepoints = {int(code, 16) for code in re.findall(r'content\s*:\s*"\\([0-9a-fA-F]{4,5})"', css)}
+    # Only the woff2 sources are shipped; every supported browser reads them
+    css = re.sub(r',\s*url\([^)]*\.ttf\)\s*format\(["\']truetype["\']\)', '', css)
+
+    def replace(match):
+        name = match.group(1)
+        source = fetch(name, WEBFONTS_URL + name)
+        target = static_path(f"{FONT_DIR}/{name}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if codepoints:
+            options = subset.Options()
+            options.flavor = 'woff2'
+            font = subset.load_font(source, options)
+            subsetter = subset.Subsetter(options)
+            subsetter.populate(unicodes=codepoints)
+            subsetter.subset(font)
+            subset.save_font(font, target, options)
+        else:
+            shutil.copyfile(source, target)
+        entry = build_asset(f"{FONT_DIR}/{name}")
+        return f"url({current_app.static_url_path}/{entry['file']})"
+
+    return re.sub(r'url\(["\']?\.\./webfonts/([\w.-]+\.woff2)["\']?\)', replace, css)
+
+
+# Download the vendor files, purge unused selectors and write one CSS and one
+# JS bundle. Returns {bundle: (original bytes, bundled bytes)}.
+def build_vendor_bundle():
+    # Copying the fonts whole would ship every icon Font Awesome has
+    if subset is None:
+        raise RuntimeError("Building the vendor bundle needs fontTools and brotli (pip install fonttools brotli)")
+    js_sources = [fetch(name, url) for name, url in VENDOR_JS.items()]
+    content = content_sources(js_sources)
+
+    original_css = 0
+    parts = []
+    for name, url in VENDOR_CSS.items():
+        css = read(fetch(name, url))
+        original_css += len(css.encode('utf-8'))
+        parts.append(purge_css(css, content))
+    css = bundle_fonts('\n'.join(parts))
+
+    js = '\n;\n'.join(read(path) for path in js_sources)
+    sizes = {}
+    for filename, content, original in ((BUNDLE_CSS, css, original_css),
+                                        (BUNDLE_JS, js, len(js.encode('utf-8')))):
+        with open(static_path(filename), 'w', encoding='utf-8') as f:
+            f.write(content)
+        sizes[filename] = (original, len(content.encode('utf-8')))
+    return sizes
+
+
+# Template helper: base.html links the local bundle once it has been built,
+# and the CDN files otherwise
+def vendor_bundle():
+    return current_app.config.get('VENDOR_BUNDLE', True) and \
+        os.path.exists(static_path(BUNDLE_CSS)) and os.path.exists(static_path(BUNDLE_JS))
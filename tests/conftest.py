@@ -0,0 +1,108 @@
+import os
+import shutil
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import app as app_module
+from extensions import db
+
+
+# Accepts every message except those addressed to a recipient containing
+# 'reject', which it refuses
+class SMTPHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if 'reject' in address.lower():
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((list(envelope.rcpt_tos), envelope.content))
+        return '250 OK'
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope='session')
+def smtp_server():
+    controller = Controller(SMTPHandler(), hostname='127.0.0.1', port=unused_port())
+    controller.start()
+    yield controller
+    controller.stop()
+
+
+def make_config(database):
+    return {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{database}",
+        'APP_ENV': 'production',
+        'JINJA_BYTECODE_CACHE_DIR': None,
+        # Keep build output out of the real static/ tree
+        'ASSET_FINGERPRINTING': False,
+        'CRITICAL_CSS_ENABLED': False,
+        'PAGE_CACHE_ENABLED': False,
+        'WTF_CSRF_ENABLED': False,
+        'MAIL_USERNAME': None,
+        'MAIL_SUPPRESS_SEND': True,
+        'CONTACT_RATE_LIMIT_ENABLED': False,
+    }
+
+
+# A migrated database with the admin account, built once and copied per test
+@pytest.fixture(scope='session')
+def template_database(tmp_path_factory):
+    database = tmp_path_factory.mktemp('template') / 'site.db'
+    app = app_module.create_app(make_config(database))
+    app_module.init_db(app)
+    with app.app_context():
+        db.engine.dispose()
+    return database
+
+
+# Builds apps on a fresh copy of the template database; keyword arguments
+# override the test configuration
+@pytest.fixture
+def make_app(tmp_path, template_database):
+    apps = []
+
+    def make(**config):
+        database = tmp_path / f"site{len(apps)}.db"
+        shutil.copy(template_database, database)
+        app = app_module.create_app({**make_config(database), **config})
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+# Gives the app an empty static folder of its own, for tests that write files
+@pytest.fixture
+def static_dir(app, tmp_path):
+    app.static_folder = str(tmp_path / 'static')
+    os.makedirs(app.static_folder)
+    return tmp_path / 'static'
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = 'admin:1'
+    return client
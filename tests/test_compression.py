@@ -0,0 +1,81 @@
+import gzip
+
+import brotli
+import pytest
+
+from services import compression
+from services.page_cache import page_cache
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def get(client, accept_encoding=None):
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+    return client.get('/', headers=headers)
+
+
+def test_brotli_is_preferred_over_gzip(client):
+    response = get(client, 'gzip, deflate, br')
+    assert response.content_encoding == 'br'
+    assert b'<html' in brotli.decompress(response.get_data())
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_gzip_when_brotli_is_not_accepted(client):
+    response = get(client, 'gzip;q=1.0, br;q=0')
+    assert response.content_encoding == 'gzip'
+    assert b'<html' in gzip.decompress(response.get_data())
+
+
+def test_identity_without_accept_encoding(client):
+    response = get(client)
+    assert response.content_encoding is None
+    assert b'<html' in response.get_data()
+    # Caches must still keep the encodings apart
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_compressed_responses_carry_a_weak_etag(client):
+    response = get(client, 'gzip')
+    etag, weak = response.get_etag()
+    assert etag and weak
+    # ...which still revalidates the page
+    assert client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'W/"{etag}"'}).status_code == 304
+
+
+def test_small_bodies_are_sent_as_they_are(app, client):
+    app.config['COMPRESSION_MIN_SIZE'] = 10 ** 7
+    response = get(client, 'gzip, br')
+    assert response.content_encoding is None
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_only_allowlisted_mimetypes_are_compressed(app, client):
+    app.config['COMPRESSION_MIMETYPES'] = ('application/json',)
+    response = get(client, 'gzip, br')
+    assert response.content_encoding is None
+    assert 'Accept-Encoding' not in response.vary
+
+
+# The page cache is shared by every app in the process
+@pytest.fixture
+def cached_client(make_app):
+    page_cache.clear()
+    yield make_app(PAGE_CACHE_ENABLED=True).test_client()
+    page_cache.clear()
+
+
+def test_cached_pages_are_compressed_once_per_encoding(cached_client, monkeypatch):
+    client = cached_client
+    calls = []
+    compress = compression.compress
+    monkeypatch.setattr(compression, 'compress', lambda data, encoding: calls.append(encoding) or compress(data, encoding))
+
+    bodies = [get(client, 'br').get_data() for _ in range(3)]
+    bodies += [get(client, 'gzip').get_data() for _ in range(2)]
+    assert calls == ['br', 'gzip']
+    assert bodies[0] == bodies[1] == bodies[2]
+    assert gzip.decompress(bodies[3]) == brotli.decompress(bodies[0])
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects.sqlite import insert
+from werkzeug.http import http_date
+
+from extensions import db
+from models.models import ContentVersion, Project
+from services.content_version import content_versions
+from services.page_cache import page_cache
+
+
+@pytest.fixture
+def client(make_app):
+    # Poll on every request, and serve from the page cache as in production
+    app = make_app(CONTENT_VERSION_POLL_INTERVAL=0, PAGE_CACHE_ENABLED=True)
+    page_cache.clear()
+    yield app.test_client()
+    page_cache.clear()
+
+
+def test_matching_etag_gets_not_modified(client):
+    response = client.get('/projects')
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert etag and not weak
+    assert response.cache_control.no_cache
+    assert 'Cookie' in response.vary
+
+    response = client.get('/projects', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.get_etag() == (etag, False)
+    assert client.get('/projects', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_if_modified_since(client):
+    last_modified = client.get('/projects').last_modified
+    assert last_modified is not None
+
+    assert client.get('/projects', headers={'If-Modified-Since': http_date(last_modified)}).status_code == 304
+    earlier = last_modified - timedelta(hours=1)
+    assert client.get('/projects', headers={'If-Modified-Since': http_date(earlier)}).status_code == 200
+
+
+def test_logged_in_visitors_get_their_own_etag(client):
+    anonymous = client.get('/projects').get_etag()[0]
+    with client.session_transaction() as session:
+        session['_user_id'] = 'admin:1'
+    assert client.get('/projects', headers={'If-None-Match': f'"{anonymous}"'}).status_code == 200
+
+
+def test_commit_from_another_process_changes_the_page(client):
+    response = client.get('/projects')
+    etag = response.get_etag()[0]
+    assert b'Built elsewhere' not in response.get_data()
+
+    # Written by another worker: straight to the database, so this process
+    # only learns of it by polling content_versions
+    with client.application.app_context(), db.engine.begin() as connection:
+        (current,), _ = content_versions.watermark(('projects',))
+        connection.execute(Project.__table__.insert().values(
+            title='Built elsewhere', description='d', image='x.png'))
+        connection.execute(insert(ContentVersion.__table__)
+                           .values(table_name='projects', version=current + 1, updated_at=datetime.utcnow())
+                           .on_conflict_do_update(index_elements=['table_name'],
+                                                  set_={'version': current + 1, 'updated_at': datetime.utcnow()}))
+
+    response = client.get('/projects', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+    # The page cache was emptied too
+    assert b'Built elsewhere' in response.get_data()
@@ -0,0 +1,24 @@
+from models.models import Message, OutboxMessage
+
+FORM = {'name': 'Visitor', 'email': 'visitor@example.com', 'message': 'Hello, I would like to get in touch.'}
+
+
+def test_message_is_stored_and_mail_queued(app):
+    response = app.test_client().post('/contact', data=FORM)
+    assert response.status_code == 302
+    with app.app_context():
+        message = Message.query.one()
+        assert OutboxMessage.query.filter_by(message_id=message.id).count() == 1
+
+
+def test_visitors_behind_the_proxy_get_their_own_limit(make_app):
+    app = make_app(CONTACT_RATE_LIMIT_ENABLED=True, CONTACT_IP_BURST=1, TRUSTED_PROXIES=1)
+    client = app.test_client()
+
+    def post(client_ip, message):
+        data = {**FORM, 'email': f"{message}@example.com", 'message': f"{FORM['message']} {message}"}
+        return client.post('/contact', data=data, headers={'X-Forwarded-For': client_ip}, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+
+    assert post('203.0.113.1', 'first').status_code == 302
+    assert post('203.0.113.1', 'second').status_code == 429
+    assert post('203.0.113.2', 'third').status_code == 302
@@ -0,0 +1,25 @@
+import pytest
+
+import app as app_module
+from services.database import stress_test
+
+
+def test_mixed_reads_and_writes_do_not_fail(app):
+    counts, errors = stress_test(app, seconds=2, readers=4, writers=2)
+    assert errors == []
+    assert counts['reads'] > 0
+    assert counts['writes'] > 0
+
+
+def test_pool_settings_come_from_the_config(make_app):
+    app = make_app(DB_POOL_SIZE=2, DB_MAX_OVERFLOW=0, DB_POOL_TIMEOUT=1)
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] == {'pool_size': 2, 'max_overflow': 0, 'pool_timeout': 1}
+
+
+def test_unknown_app_env_needs_explicit_pragmas(tmp_path):
+    config = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'site.db'}", 'APP_ENV': 'staging',
+              'JINJA_BYTECODE_CACHE_DIR': None}
+    with pytest.raises(RuntimeError, match='APP_ENV'):
+        app_module.create_app(config)
+    app = app_module.create_app({**config, 'SQLITE_PRAGMAS': {'busy_timeout': 5000}})
+    assert app.config['SQLITE_PRAGMAS'] == {'busy_timeout': 5000}
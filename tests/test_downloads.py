@@ -0,0 +1,78 @@
+import hashlib
+
+import pytest
+
+from extensions import db
+from models.models import Resume
+
+DATA = bytes(range(256)) * 40
+ETAG = hashlib.sha256(DATA).hexdigest()
+FILENAME = f"{ETAG}.pdf"
+
+
+@pytest.fixture
+def client(app, static_dir):
+    (static_dir / 'files').mkdir()
+    (static_dir / 'files' / FILENAME).write_bytes(DATA)
+    with app.app_context():
+        db.session.add(Resume(filename=FILENAME))
+        db.session.commit()
+    return app.test_client()
+
+
+def download(client, **headers):
+    return client.get('/download-resume', headers=headers)
+
+
+def test_full_download(client):
+    response = download(client)
+    assert response.status_code == 200
+    assert response.get_data() == DATA
+    assert response.get_etag() == (ETAG, False)
+    assert response.accept_ranges == 'bytes'
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert response.cache_control.no_cache
+
+
+def test_range_request_gets_partial_content(client):
+    response = download(client, Range='bytes=100-199')
+    assert response.status_code == 206
+    assert response.get_data() == DATA[100:200]
+    assert response.headers['Content-Range'] == f"bytes 100-199/{len(DATA)}"
+
+
+def test_if_range_with_the_current_etag_honours_the_range(client):
+    response = download(client, Range='bytes=0-9', **{'If-Range': f'"{ETAG}"'})
+    assert response.status_code == 206
+    assert response.get_data() == DATA[:10]
+
+
+def test_if_range_with_a_stale_etag_sends_the_whole_file(client):
+    response = download(client, Range='bytes=0-9', **{'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.get_data() == DATA
+
+
+def test_if_none_match_gets_not_modified(client):
+    response = download(client, **{'If-None-Match': f'"{ETAG}"'})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert download(client, **{'If-None-Match': '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize('offload, header, target', [
+    ('x-sendfile', 'X-Sendfile', None),
+    ('x-accel-redirect', 'X-Accel-Redirect', f"/protected/files/{FILENAME}"),
+])
+def test_offloaded_downloads_only_send_headers(app, client, static_dir, offload, header, target):
+    app.config['FILE_OFFLOAD'] = offload
+    response = download(client)
+    assert response.status_code == 200
+    assert response.get_data() == b''
+    assert response.headers[header] == (target or str(static_dir / 'files' / FILENAME))
+    assert response.get_etag() == (ETAG, False)
+
+    # Conditional requests are still answered by the app, without the header
+    response = download(client, **{'If-None-Match': f'"{ETAG}"'})
+    assert response.status_code == 304
+    assert header not in response.headers
@@ -0,0 +1,108 @@
+import os
+import time
+
+import pytest
+
+from app import gc_files
+from extensions import db
+from models.models import Blob, Project, Skill
+from services.file_gc import collect_garbage
+
+LIVE = 'a' * 64
+DEAD = 'b' * 64
+DAY = 86400
+
+
+# A blob under static/blobs linked into each of directories, recorded with refcount 0
+def add_blob(static_dir, digest, size, *directories):
+    blob = static_dir / 'blobs' / digest[:2] / f"{digest}.png"
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    blob.write_bytes(b'x' * size)
+    for directory in directories:
+        link = static_dir / directory / f"{digest}.png"
+        link.parent.mkdir(parents=True, exist_ok=True)
+        os.link(blob, link)
+    db.session.add(Blob(digest=digest, extension='.png', size=size, refcount=0))
+    db.session.commit()
+    return blob
+
+
+def backdate(*paths):
+    for path in paths:
+        os.utime(path, (time.time() - 2 * DAY, time.time() - 2 * DAY))
+
+
+@pytest.fixture
+def files(app, static_dir):
+    with app.app_context():
+        # LIVE is used by a project; an orphaned copy of it sits under skills
+        live = add_blob(static_dir, LIVE, 1000, 'images/projects', 'images/skills')
+        db.session.add(Project(title='p', description='d', image=f"{LIVE}.png"))
+        # DEAD lost its last reference
+        dead = add_blob(static_dir, DEAD, 300, 'images/certificates')
+        # Shipped files never match an upload name
+        (static_dir / 'images' / 'profile.jpg').write_bytes(b'shipped')
+        db.session.commit()
+        yield {'live': live, 'dead': dead}
+
+
+def orphans(report):
+    return sorted(path for path, _ in report.orphans)
+
+
+def test_only_unreferenced_upload_files_are_orphans(files):
+    report = collect_garbage(grace_period=0)
+    assert orphans(report) == [
+        f"blobs/bb/{DEAD}.png",
+        f"images/certificates/{DEAD}.png",
+        f"images/skills/{LIVE}.png",
+    ]
+    assert report.deleted == 0
+
+
+def test_hard_linked_bytes_count_once_and_only_when_every_link_goes(files):
+    report = collect_garbage(grace_period=0)
+    # DEAD's blob and its one link share 300 bytes; LIVE keeps its other links
+    assert report.reclaimable == 300
+
+
+def test_files_changed_within_the_grace_period_are_kept(files, static_dir):
+    report = collect_garbage(grace_period=DAY)
+    assert report.orphans == []
+    assert report.recent == 3
+
+    # Linking a blob into place leaves its mtime alone but bumps the ctime,
+    # so an old mtime alone doesn't make a file collectable
+    backdate(files['dead'], static_dir / 'images' / 'skills' / f"{LIVE}.png")
+    assert collect_garbage(grace_period=DAY).orphans == []
+
+
+def test_dry_run_leaves_files_and_rows_alone(app, files):
+    result = app.test_cli_runner().invoke(gc_files, ['--grace-hours', '0'])
+    assert 'Found 3 orphaned files' in result.output
+    assert files['dead'].exists()
+    assert db.session.get(Blob, DEAD) is not None
+
+
+def test_delete_reclaims_orphans_and_unreferenced_blobs(app, files, static_dir):
+    result = app.test_cli_runner().invoke(gc_files, ['--delete', '--grace-hours', '0'])
+    assert 'Removed 3 orphaned files' in result.output
+
+    assert not files['dead'].exists()
+    assert not (static_dir / 'images' / 'certificates' / f"{DEAD}.png").exists()
+    assert not (static_dir / 'images' / 'skills' / f"{LIVE}.png").exists()
+    db.session.expire_all()
+    assert db.session.get(Blob, DEAD) is None
+
+
+def test_referenced_files_are_never_touched(files, static_dir):
+    db.session.add(Skill(name='s', icon='i', image=f"{LIVE}.png"))
+    db.session.commit()
+    report = collect_garbage(delete=True, grace_period=0)
+
+    assert f"images/skills/{LIVE}.png" not in orphans(report)
+    assert files['live'].exists()
+    assert (static_dir / 'images' / 'projects' / f"{LIVE}.png").exists()
+    assert (static_dir / 'images' / 'skills' / f"{LIVE}.png").exists()
+    assert (static_dir / 'images' / 'profile.jpg').exists()
+    assert db.session.get(Blob, LIVE).refcount == 2
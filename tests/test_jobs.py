@@ -0,0 +1,51 @@
+import threading
+import time
+
+from extensions import db
+from models.models import Job
+from services.jobs import enqueue, enqueue_once, job_handler
+
+attempt_times = []
+finished = threading.Event()
+
+
+@job_handler('test_flaky')
+def flaky():
+    attempt_times.append(time.monotonic())
+    if len(attempt_times) < 3:
+        raise RuntimeError('database is locked')
+    finished.set()
+
+
+@job_handler('test_noop')
+def noop(**payload):
+    pass
+
+
+def test_failed_job_is_retried_after_a_growing_delay(app):
+    app.config['JOB_RETRY_DELAY'] = 0.2
+    with app.app_context():
+        job_id = enqueue('test_flaky').id
+        db.session.commit()
+    assert finished.wait(5)
+
+    first, second, third = attempt_times
+    assert second - first >= 0.2
+    assert third - second >= 0.4
+    with app.app_context():
+        # Committed just after the handler returns
+        for _ in range(50):
+            job = db.session.get(Job, job_id)
+            if job.status == 'done':
+                break
+            db.session.rollback()
+            time.sleep(0.05)
+        assert (job.status, job.attempts) == ('done', 3)
+
+
+def test_enqueue_once_reuses_an_unfinished_job(app):
+    with app.app_context():
+        job = enqueue_once('test_noop', source='a.png')
+        assert enqueue_once('test_noop', source='a.png') is job
+        assert enqueue_once('test_noop', source='b.png') is not job
+        db.session.rollback()
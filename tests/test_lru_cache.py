@@ -0,0 +1,56 @@
+from services import lru_cache
+from services.lru_cache import LRUCache
+from services.page_cache import PageCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert len(cache) == 2
+
+
+def test_entries_expire_after_their_timeout(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(lru_cache.time, 'monotonic', clock)
+    cache = LRUCache()
+    cache.set('short', 1, timeout=10)
+    cache.set('forever', 2)
+
+    clock.now += 9
+    assert cache.get('short') == 1
+    clock.now += 2
+    assert cache.get('short') is None
+    assert cache.get('forever') == 2
+    assert len(cache) == 1
+
+
+def test_pop_and_clear():
+    cache = LRUCache()
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.pop('a') == 1
+    assert cache.pop('a') is None
+    cache.clear()
+    assert cache.get('b') is None
+
+
+def test_page_rendered_before_a_clear_is_not_stored():
+    cache = PageCache()
+    generation = cache.generation
+    cache.clear()
+    cache.set('/', 'stale page', generation)
+    assert cache.get('/') is None
+    cache.set('/', 'page', cache.generation)
+    assert cache.get('/') == 'page'
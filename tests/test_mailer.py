@@ -0,0 +1,74 @@
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models.models import OutboxMessage
+from services.mailer import drain_outbox, queue_mail
+
+
+@pytest.fixture
+def app(make_app, smtp_server):
+    return make_app(MAIL_SERVER=smtp_server.hostname, MAIL_PORT=smtp_server.port,
+                    MAIL_USE_TLS=False, MAIL_SUPPRESS_SEND=False)
+
+
+@pytest.fixture
+def context(app, smtp_server):
+    smtp_server.handler.messages.clear()
+    with app.app_context():
+        yield
+
+
+def queued(recipient):
+    item = queue_mail(subject='Hello', recipients=[recipient], body='Body')
+    db.session.commit()
+    return item.id
+
+
+def make_due(item_id):
+    db.session.get(OutboxMessage, item_id).next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_queued_mail_is_sent(context, smtp_server):
+    item_id = queued('someone@example.com')
+    assert drain_outbox() == 1
+    item = db.session.get(OutboxMessage, item_id)
+    assert item.status == 'sent'
+    assert item.sent_at is not None
+    assert smtp_server.handler.messages[0][0] == ['someone@example.com']
+
+
+def test_refused_mail_is_retried_then_dead_lettered(app, context):
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+    item_id = queued('reject@example.com')
+
+    before = datetime.utcnow()
+    assert drain_outbox() == 0
+    item = db.session.get(OutboxMessage, item_id)
+    assert (item.status, item.attempts) == ('pending', 1)
+    assert item.next_attempt_at > before
+    assert item.last_error
+
+    # Not due yet
+    assert drain_outbox() == 0
+    assert db.session.get(OutboxMessage, item_id).attempts == 1
+
+    make_due(item_id)
+    drain_outbox()
+    item = db.session.get(OutboxMessage, item_id)
+    assert (item.status, item.attempts) == ('dead', 2)
+
+
+def test_unreachable_relay_backs_off_the_batch(app, context):
+    # A port nothing listens on
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        app.extensions['mail'].port = s.getsockname()[1]
+    item_ids = [queued('one@example.com'), queued('two@example.com')]
+
+    assert drain_outbox() == 0
+    items = [db.session.get(OutboxMessage, item_id) for item_id in item_ids]
+    assert [(item.status, item.attempts) for item in items] == [('pending', 1), ('pending', 1)]
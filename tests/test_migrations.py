@@ -0,0 +1,32 @@
+from sqlalchemy import create_engine, inspect
+
+from extensions import db
+from services.migrations import available_migrations, pending_migrations, upgrade
+
+
+def schema(engine):
+    inspector = inspect(engine)
+    tables = {}
+    for table in inspector.get_table_names():
+        if table.startswith('messages_fts') or table == 'schema_version':
+            continue
+        columns = [(column['name'], str(column['type']), column['nullable']) for column in inspector.get_columns(table)]
+        indexes = sorted((index['name'], tuple(index['column_names'])) for index in inspector.get_indexes(table))
+        tables[table] = (columns, indexes)
+    return tables
+
+
+def test_migrations_build_the_schema_of_the_models(tmp_path):
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    assert upgrade(migrated) == available_migrations()
+    assert pending_migrations(migrated) == []
+
+    declared = create_engine(f"sqlite:///{tmp_path / 'declared.db'}")
+    db.metadata.create_all(declared)
+    assert schema(migrated) == schema(declared)
+
+
+def test_upgrade_is_a_no_op_once_applied(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'site.db'}")
+    upgrade(engine)
+    assert upgrade(engine) == []
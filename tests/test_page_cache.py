@@ -0,0 +1,53 @@
+import pytest
+
+from extensions import db
+from models.models import Project
+from services.page_cache import page_cache
+
+
+@pytest.fixture
+def visitor(app):
+    app.config['PAGE_CACHE_ENABLED'] = True
+    page_cache.clear()
+    with app.app_context():
+        project = Project(title='Original title', description='d', image='x.png')
+        db.session.add(project)
+        db.session.commit()
+        app.project_id = project.id
+    yield app.test_client()
+    page_cache.clear()
+
+
+def cached(visitor, url):
+    body = visitor.get(url).get_data(as_text=True)
+    assert len(page_cache) > 0
+    return body
+
+
+def test_updating_a_project_evicts_the_projects_page(app, visitor, admin_client):
+    assert 'Original title' in cached(visitor, '/projects')
+    admin_client.post(f"/admin/projects/{app.project_id}/update",
+                      data={'title': 'New title', 'description': 'd', 'link': ''})
+    body = visitor.get('/projects').get_data(as_text=True)
+    assert 'New title' in body
+    assert 'Original title' not in body
+
+
+def test_deleting_a_project_evicts_the_projects_page(app, visitor, admin_client):
+    assert 'Original title' in cached(visitor, '/projects')
+    admin_client.post(f"/admin/projects/{app.project_id}/delete")
+    assert 'Original title' not in visitor.get('/projects').get_data(as_text=True)
+
+
+def test_adding_experience_evicts_the_about_page(visitor, admin_client):
+    assert 'Chief Tester' not in cached(visitor, '/about')
+    admin_client.post('/admin/experience/new', data={
+        'position': 'Chief Tester', 'company': 'Example', 'start_date': '2020', 'end_date': 'Present', 'order': 0})
+    assert 'Chief Tester' in visitor.get('/about').get_data(as_text=True)
+
+
+def test_adding_education_evicts_the_about_page(visitor, admin_client):
+    assert 'Testville University' not in cached(visitor, '/about')
+    admin_client.post('/admin/education/new', data={
+        'degree': 'BSc', 'institution': 'Testville University', 'start_date': '2016', 'end_date': '2020', 'order': 0})
+    assert 'Testville University' in visitor.get('/about').get_data(as_text=True)
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models.models import Message
+from services.pagination import decode_cursor, keyset_paginate
+
+
+@pytest.fixture
+def messages(app):
+    start = datetime(2025, 1, 1)
+    with app.app_context():
+        # Pairs of messages share a date, so the id has to break the ties
+        for i in range(7):
+            db.session.add(Message(name=f"n{i}", email=f"m{i}@example.com", message='hi',
+                                   date=start + timedelta(hours=i // 2)))
+        db.session.commit()
+        yield [message.id for message in Message.query.order_by(Message.date.desc(), Message.id.desc())]
+
+
+def paginate(**cursor):
+    return keyset_paginate(Message.query, Message.date, Message.id, 3, **cursor)
+
+
+def ids(page):
+    return [message.id for message in page.items]
+
+
+def test_pages_cover_every_message_once(app, messages):
+    pages = [paginate()]
+    while pages[-1].older:
+        pages.append(paginate(before=pages[-1].older))
+    assert [ids(page) for page in pages] == [messages[0:3], messages[3:6], messages[6:7]]
+    assert pages[0].newer is None
+
+
+def test_newer_cursor_returns_the_previous_page(app, messages):
+    first = paginate()
+    second = paginate(before=first.older)
+    back = paginate(after=second.newer)
+    assert ids(back) == ids(first)
+    assert back.older is not None
+
+
+def test_malformed_cursor_is_ignored(app, messages):
+    assert decode_cursor('not-a-cursor') is None
+    assert ids(paginate(before='garbage')) == messages[:3]
+
+
+@pytest.mark.parametrize('per_page, shown', [('-5', 1), ('0', 1), ('2', 2), ('1000', 7)])
+def test_inbox_page_size_is_clamped(admin_client, messages, per_page, shown):
+    body = admin_client.get(f"/admin/messages?per_page={per_page}").get_data(as_text=True)
+    assert sum(f"m{i}@example.com" in body for i in range(7)) == shown
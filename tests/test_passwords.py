@@ -0,0 +1,65 @@
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from extensions import db
+from models.models import User
+from services import passwords
+from services.passwords import PasswordCheckBusy, authenticate, get_executor
+
+OLD_METHOD = 'pbkdf2:sha256:1000'
+NEW_METHOD = 'pbkdf2:sha256:2000'
+
+
+@pytest.fixture
+def user(app):
+    app.config['PASSWORD_HASH_METHOD'] = NEW_METHOD
+    # The pool is sized from the config of the app that first uses it
+    passwords._pool.reset()
+    with app.app_context():
+        user = User(name='u', email='u@example.com', password=generate_password_hash('secret', method=OLD_METHOD))
+        db.session.add(user)
+        db.session.commit()
+        yield user.id
+    passwords._pool.reset()
+
+
+def stored_hash(user_id):
+    db.session.expire_all()
+    return db.session.get(User, user_id).password
+
+
+def test_old_hash_is_upgraded_on_login(user):
+    assert authenticate('u@example.com', 'secret').id == user
+    upgraded = stored_hash(user)
+    assert upgraded.startswith(NEW_METHOD + '$')
+    assert check_password_hash(upgraded, 'secret')
+
+    # Current hashes are left alone
+    assert authenticate('u@example.com', 'secret').id == user
+    assert stored_hash(user) == upgraded
+
+
+def test_wrong_password_neither_logs_in_nor_rehashes(user):
+    before = stored_hash(user)
+    assert authenticate('u@example.com', 'wrong') is None
+    assert authenticate('nobody@example.com', 'secret') is None
+    assert stored_hash(user) == before
+
+
+def test_checks_beyond_the_queue_limit_are_turned_away(app, user):
+    app.config['PASSWORD_HASH_MAX_PENDING'] = 1
+    app.config['PASSWORD_HASH_QUEUE_TIMEOUT'] = 0.05
+    passwords._pool.reset()
+    _, slots = get_executor()
+    # Another login holds the only slot
+    slots.acquire()
+    try:
+        with pytest.raises(PasswordCheckBusy):
+            authenticate('u@example.com', 'secret')
+
+        response = app.test_client().post('/login', data={'email': 'u@example.com', 'password': 'secret'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '5'
+    finally:
+        slots.release()
+    assert authenticate('u@example.com', 'secret').id == user
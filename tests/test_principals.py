@@ -0,0 +1,64 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models.models import Admin, User
+from services.principals import load_principal, principal_cache
+
+
+@pytest.fixture
+def user(app):
+    principal_cache.clear()
+    with app.app_context():
+        user = User(name='u', email='u@example.com', password=generate_password_hash('secret'))
+        db.session.add(user)
+        db.session.commit()
+        yield user.get_id()
+    principal_cache.clear()
+
+
+def test_principal_is_cached_after_first_load(app, user):
+    first = load_principal(user)
+    assert principal_cache.get(user) is first
+    assert load_principal(user) is first
+
+
+def test_password_change_drops_the_cached_principal(app, user):
+    cached = load_principal(user)
+    db.session.get(User, cached.id).set_password('changed')
+    db.session.commit()
+
+    assert principal_cache.get(user) is None
+    fresh = load_principal(user)
+    assert fresh is not cached
+    assert fresh.password != cached.password
+
+
+def test_admin_account_change_drops_the_cached_principal(app):
+    principal_cache.clear()
+    with app.app_context():
+        assert principal_cache.get(load_principal('admin:1').get_id()) is not None
+        db.session.get(Admin, 1).email = 'new-admin@example.com'
+        db.session.commit()
+
+        assert principal_cache.get('admin:1') is None
+        assert load_principal('admin:1').email == 'new-admin@example.com'
+    principal_cache.clear()
+
+
+def test_deleted_account_is_not_served_from_the_cache(app, user):
+    load_principal(user)
+    db.session.delete(db.session.get(User, int(user.partition(':')[2])))
+    db.session.commit()
+
+    assert principal_cache.get(user) is None
+    assert load_principal(user) is None
+
+
+def test_rolled_back_change_keeps_the_cached_principal(app, user):
+    cached = load_principal(user)
+    db.session.get(User, cached.id).set_password('changed')
+    db.session.flush()
+    db.session.rollback()
+
+    assert principal_cache.get(user) is cached
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+from services.process_local import ProcessLocal
+
+
+def test_value_is_built_once():
+    local = ProcessLocal()
+    assert local.get(object) is local.get(object)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_builds_its_own_value():
+    local = ProcessLocal()
+    parent = local.get(object)
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if local.get(object) is not parent else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert local.get(object) is parent
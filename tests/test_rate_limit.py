@@ -0,0 +1,42 @@
+from services import rate_limit
+from services.rate_limit import TokenBuckets
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_refill(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    buckets = TokenBuckets()
+
+    assert [buckets.allow('1.2.3.4', burst=3, per_hour=6) for _ in range(4)] == [True, True, True, False]
+    # Six an hour: one token every ten minutes
+    clock.now += 599
+    assert not buckets.allow('1.2.3.4', burst=3, per_hour=6)
+    clock.now += 601
+    assert buckets.allow('1.2.3.4', burst=3, per_hour=6)
+
+
+def test_keys_have_separate_buckets(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, 'monotonic', Clock())
+    buckets = TokenBuckets()
+    assert buckets.allow('a', burst=1, per_hour=1)
+    assert not buckets.allow('a', burst=1, per_hour=1)
+    assert buckets.allow('b', burst=1, per_hour=1)
+
+
+def test_full_buckets_are_pruned(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    buckets = TokenBuckets(max_keys=2)
+    for key in ('a', 'b'):
+        buckets.allow(key, burst=1, per_hour=3600)
+    clock.now += 10
+    buckets.allow('c', burst=1, per_hour=3600)
+    assert set(buckets._buckets) == {'c'}
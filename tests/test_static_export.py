@@ -0,0 +1,100 @@
+import os
+import time
+
+import pytest
+
+from extensions import db
+from models.models import Project
+from services.static_export import EXPORT_PAGES, export_site, page_file, page_urls, releases_dir
+
+
+@pytest.fixture
+def export_app(make_app, tmp_path):
+    app = make_app(STATIC_EXPORT_DIR=str(tmp_path / 'export'), STATIC_EXPORT_KEEP=2)
+    app.static_folder = str(tmp_path / 'static')
+    os.makedirs(os.path.join(app.static_folder, 'css'))
+    with open(os.path.join(app.static_folder, 'css', 'style.css'), 'w') as f:
+        f.write('body {}')
+    return app
+
+
+def export_dir(app):
+    return app.config['STATIC_EXPORT_DIR']
+
+
+def releases(app):
+    root = releases_dir(export_dir(app))
+    return sorted(name for name in os.listdir(root) if not name.startswith('.'))
+
+
+def page_path(app, endpoint):
+    return os.path.join(export_dir(app), page_file(page_urls(app, endpoint)[0]))
+
+
+def read_page(app, endpoint):
+    with open(page_path(app, endpoint), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_export_renders_every_page_and_links_static_files(export_app):
+    assert export_site(export_app) == set(EXPORT_PAGES)
+
+    export = export_dir(export_app)
+    assert os.path.islink(export)
+    for endpoint in EXPORT_PAGES:
+        for url in page_urls(export_app, endpoint):
+            assert os.path.getsize(os.path.join(export, page_file(url))) > 0
+    static_copy = os.path.join(export, 'static', 'css', 'style.css')
+    assert os.path.samefile(static_copy, os.path.join(export_app.static_folder, 'css', 'style.css'))
+
+
+def test_each_export_swaps_the_link_to_a_new_release(export_app):
+    export_site(export_app)
+    first = os.path.realpath(export_dir(export_app))
+    export_site(export_app)
+    second = os.path.realpath(export_dir(export_app))
+
+    assert first != second
+    assert os.path.dirname(second) == releases_dir(export_dir(export_app))
+    # No temporary link is left next to the export
+    assert not [name for name in os.listdir(os.path.dirname(export_dir(export_app))) if name.endswith('.tmp')]
+
+
+def test_old_releases_are_pruned(export_app):
+    for _ in range(4):
+        export_site(export_app)
+
+    kept = releases(export_app)
+    assert len(kept) == 2
+    assert os.path.basename(os.path.realpath(export_dir(export_app))) in kept
+
+
+def test_incremental_export_renders_only_the_given_pages(export_app):
+    export_site(export_app)
+    previous = {endpoint: os.stat(page_path(export_app, endpoint)) for endpoint in EXPORT_PAGES}
+
+    assert export_site(export_app, {'main.projects'}) == {'main.projects'}
+
+    for endpoint, before in previous.items():
+        after = os.stat(page_path(export_app, endpoint))
+        if endpoint == 'main.projects':
+            assert after.st_ino != before.st_ino
+        else:
+            # Linked from the previous release rather than rendered again
+            assert after.st_ino == before.st_ino
+
+
+def test_content_commit_regenerates_the_pages_showing_it(export_app):
+    export_site(export_app)
+    about = os.stat(page_path(export_app, 'main.about'))
+
+    with export_app.app_context():
+        db.session.add(Project(title='Exported project', description='d', image='p.png'))
+        db.session.commit()
+
+    # The export is regenerated in the background
+    deadline = time.monotonic() + 5
+    while 'Exported project' not in read_page(export_app, 'main.projects'):
+        assert time.monotonic() < deadline, "the projects page was not re-exported"
+        time.sleep(0.05)
+    assert os.stat(page_path(export_app, 'main.about')).st_ino == about.st_ino
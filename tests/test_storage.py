@@ -0,0 +1,128 @@
+import io
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from moto import mock_aws
+
+from extensions import db
+from models.models import Blob, Project
+from services.file_gc import collect_garbage
+from services.storage import S3Storage
+from services.uploads import blob_key
+
+BUCKET = 'techhead-test'
+PART_SIZE = 5 * 1024 * 1024  # The smallest part S3 accepts
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        storage = S3Storage(BUCKET, region='us-east-1',
+                            multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE)
+        storage.client.create_bucket(Bucket=BUCKET)
+        yield storage
+
+
+def test_put_get_and_stat(s3):
+    s3.put('blobs/ab/abc.png', io.BytesIO(b'png bytes'), content_type='image/png')
+
+    with s3.get('blobs/ab/abc.png') as f:
+        assert f.read() == b'png bytes'
+    stored = s3.stat('blobs/ab/abc.png')
+    assert stored.size == 9
+    assert stored.etag and '"' not in stored.etag
+    head = s3.client.head_object(Bucket=BUCKET, Key='blobs/ab/abc.png')
+    assert head['ContentType'] == 'image/png'
+    assert head['CacheControl'] == 'public, max-age=31536000, immutable'
+
+
+def test_large_files_are_uploaded_in_parts(s3):
+    data = os.urandom(2 * PART_SIZE + 1)
+    s3.put('files/resume.pdf', io.BytesIO(data))
+
+    # A multipart ETag ends in the number of parts
+    assert s3.stat('files/resume.pdf').etag.endswith('-3')
+    with s3.get('files/resume.pdf') as f:
+        assert f.read() == data
+
+
+def test_put_rewinds_a_read_file(s3):
+    fileobj = io.BytesIO(b'spooled')
+    fileobj.read()
+    s3.put('files/a.pdf', fileobj)
+    assert s3.stat('files/a.pdf').size == 7
+
+
+def test_missing_keys(s3):
+    assert s3.stat('images/missing.png') is None
+    with pytest.raises(FileNotFoundError):
+        s3.get('images/missing.png')
+
+
+def test_delete(s3):
+    s3.put('images/a.png', io.BytesIO(b'a'))
+    s3.delete('images/a.png')
+    assert s3.stat('images/a.png') is None
+    # Deleting a missing key is not an error
+    s3.delete('images/a.png')
+
+
+def test_urls_are_presigned_unless_public(s3):
+    url = s3.url('images/a.png')
+    assert f"/{BUCKET}/images/a.png" in url or f"{BUCKET}.s3" in url
+    assert 'Signature=' in url
+
+    download = s3.url('files/a.pdf', download_name='resume.pdf', expires=60)
+    assert 'response-content-disposition=attachment' in download
+    assert 'Expires=60' in download or 'X-Amz-Expires=60' in download
+
+    s3.public_url = 'https://cdn.example.com'
+    assert s3.url('images/a.png') == 'https://cdn.example.com/images/a.png'
+    # Downloads still need a signed Content-Disposition
+    assert 'Signature=' in s3.url('files/a.pdf', download_name='resume.pdf')
+
+
+DIGEST = 'c' * 64
+
+
+@pytest.fixture
+def s3_app(make_app, s3):
+    app = make_app(STORAGE_BACKEND='s3', STORAGE_S3_BUCKET=BUCKET, STORAGE_S3_REGION='us-east-1')
+    with app.app_context():
+        s3.put(blob_key(DIGEST, '.png'), io.BytesIO(b'png'))
+        db.session.add(Blob(digest=DIGEST, extension='.png', size=3, refcount=0,
+                            created_at=datetime.utcnow() - timedelta(days=2)))
+        db.session.commit()
+        yield app
+
+
+def test_blob_is_deleted_from_the_bucket_with_its_last_reference(s3_app, s3):
+    project = Project(title='p', description='d', image=f"{DIGEST}.png")
+    db.session.add(project)
+    db.session.commit()
+    db.session.delete(project)
+    db.session.commit()
+
+    # Deleted in the background after the commit
+    for _ in range(50):
+        if s3.stat(blob_key(DIGEST, '.png')) is None:
+            break
+        time.sleep(0.05)
+    assert s3.stat(blob_key(DIGEST, '.png')) is None
+    db.session.expire_all()
+    assert db.session.get(Blob, DIGEST) is None
+
+
+def test_garbage_collector_deletes_unreferenced_remote_blobs(s3_app, s3):
+    report = collect_garbage(delete=False)
+    assert report.orphans == [(blob_key(DIGEST, '.png'), 3)]
+    assert s3.stat(blob_key(DIGEST, '.png')) is not None
+
+    report = collect_garbage(delete=True)
+    assert report.deleted == 1
+    assert s3.stat(blob_key(DIGEST, '.png')) is None
+    assert db.session.get(Blob, DIGEST) is None
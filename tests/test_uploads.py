@@ -0,0 +1,136 @@
+import hashlib
+import io
+import os
+
+import pytest
+from flask import request
+
+from extensions import db
+from models.models import Blob, Project, Resume, Skill
+from services.uploads import add_blob
+
+DIGEST_A = 'a' * 64
+DIGEST_B = 'b' * 64
+
+
+@pytest.fixture
+def blobs(app):
+    with app.app_context():
+        db.session.add(Blob(digest=DIGEST_A, extension='.png', size=1, refcount=0))
+        db.session.add(Blob(digest=DIGEST_B, extension='.png', size=1, refcount=0))
+        db.session.commit()
+        yield
+
+
+def refcounts():
+    db.session.expire_all()
+    return {blob.digest[0]: blob.refcount for blob in Blob.query.all()}
+
+
+def test_refcounts_follow_inserts_updates_and_deletes(app, blobs):
+    project = Project(title='p', description='d', image=f"{DIGEST_A}.png")
+    skill = Skill(name='s', icon='i', image=f"{DIGEST_A}.png")
+    db.session.add_all([project, skill])
+    db.session.commit()
+    assert refcounts() == {'a': 2, 'b': 0}
+
+    project.image = f"{DIGEST_B}.png"
+    db.session.commit()
+    assert refcounts() == {'a': 1, 'b': 1}
+
+    db.session.delete(skill)
+    db.session.commit()
+    assert refcounts() == {'a': 0, 'b': 1}
+
+    db.session.delete(project)
+    db.session.commit()
+    assert refcounts() == {'a': 0, 'b': 0}
+
+
+def test_legacy_filenames_are_not_counted(app, blobs):
+    db.session.add(Project(title='p', description='d', image='0123456789abcdef.png'))
+    db.session.commit()
+    assert refcounts() == {'a': 0, 'b': 0}
+
+
+def test_rolled_back_changes_are_not_counted(app, blobs):
+    db.session.add(Project(title='p', description='d', image=f"{DIGEST_A}.png"))
+    db.session.flush()
+    db.session.rollback()
+    assert refcounts() == {'a': 0, 'b': 0}
+
+
+def test_adding_a_stored_blob_keeps_the_first_row(app, blobs):
+    # As another request storing the same file would
+    add_blob(DIGEST_A, '.png', 2)
+    db.session.commit()
+    db.session.expire_all()
+    assert db.session.get(Blob, DIGEST_A).size == 1
+
+
+PDF = b'%PDF-1.4\n' + b'0' * 4000
+
+
+@pytest.fixture
+def upload_client(app, admin_client, static_dir, tmp_path):
+    app.config['UPLOAD_SPOOL_DIR'] = str(tmp_path / 'spool')
+    # Small enough that every test upload spills to a file
+    app.config['UPLOAD_SPOOL_SIZE'] = 1024
+    return admin_client
+
+
+def post_file(client, url, field, data, filename):
+    return client.post(url, data={field: (io.BytesIO(data), filename)}, content_type='multipart/form-data')
+
+
+def stored_files(directory):
+    return sorted(os.path.relpath(os.path.join(dirpath, name), directory).replace(os.sep, '/')
+                  for dirpath, _, names in os.walk(directory) for name in names)
+
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.get('_flashes', [])]
+
+
+def test_valid_upload_is_moved_into_the_blob_store(app, upload_client, static_dir, tmp_path):
+    response = post_file(upload_client, '/admin/resume', 'resume', PDF, 'cv.pdf')
+    assert response.status_code == 302
+
+    digest = hashlib.sha256(PDF).hexdigest()
+    assert stored_files(static_dir) == [f"blobs/{digest[:2]}/{digest}.pdf", f"files/{digest}.pdf"]
+    assert (static_dir / 'files' / f"{digest}.pdf").read_bytes() == PDF
+    # The spooled copy was renamed into place, not left behind
+    assert stored_files(tmp_path / 'spool') == []
+    with app.app_context():
+        assert Resume.query.one().filename == f"{digest}.pdf"
+        assert db.session.get(Blob, digest).refcount == 1
+
+
+def test_large_uploads_spill_outside_static(app, upload_client, static_dir, tmp_path):
+    with app.test_request_context():
+        spool = request._get_file_stream(len(PDF), 'application/pdf', 'cv.pdf')
+        spool.write(PDF)
+        assert os.path.dirname(spool.path) == str(tmp_path / 'spool')
+        spool.close()
+    assert stored_files(static_dir) == []
+
+
+def test_upload_over_the_limit_for_its_type_is_refused(app, upload_client, static_dir, tmp_path):
+    app.config['UPLOAD_SIZE_LIMITS'] = {'image': 2048, 'pdf': 20 * 1024 * 1024}
+    response = post_file(upload_client, '/admin/images/upload/profile', 'image',
+                         b'\x89PNG\r\n\x1a\n' + b'0' * 4096, 'big.png')
+    assert response.status_code == 302
+    assert 'limited to' in flashes(upload_client)[0]
+    assert stored_files(static_dir) == []
+    assert stored_files(tmp_path / 'spool') == []
+
+
+def test_upload_with_the_wrong_magic_bytes_is_refused(app, upload_client, static_dir, tmp_path):
+    response = post_file(upload_client, '/admin/images/upload/profile', 'image', PDF, 'photo.png')
+    assert response.status_code == 302
+    assert 'not a valid image' in flashes(upload_client)[0]
+    assert stored_files(static_dir) == []
+    assert stored_files(tmp_path / 'spool') == []
+    with app.app_context():
+        assert Blob.query.count() == 0
@@ -0,0 +1,9 @@
+from app import build_vendor
+from services import vendor
+
+
+def test_build_vendor_fails_without_fonttools(app, monkeypatch):
+    monkeypatch.setattr(vendor, 'subset', None)
+    result = app.test_cli_runner().invoke(build_vendor)
+    assert result.exit_code == 1
+    assert 'pip install fonttools brotli' in result.output